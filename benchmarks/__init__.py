@@ -0,0 +1,10 @@
+"""
+The benchmarks package
+======================
+This package contains the benchmark suite of the site builder. It consists of:
+
+- The manual module, which generates a synthetic manual (content folder with md files, `structure.xlsx` and `properties.ini`) of configurable size.
+- The run module, which times the main parts of the site builder on such a manual and stores the results, so the results of different versions can be compared on the same machine.
+
+Run the benchmarks from the main folder with `python -m benchmarks.run` (see the run module for the available flags).
+"""
@@ -0,0 +1,236 @@
+"""
+The manual module
+=================
+This module generates a synthetic manual that can be built by the site builder. The manual consists of:
+
+- A home page and a number of sections, each containing a number of chapters, each containing a number of pages.
+- An md file for every page (named according to the convention of the build structure script), with a random mix of section types.
+- A `structure.xlsx` with the site structure (every other page has a crossref code).
+- A `properties.ini` with the site properties.
+
+The contents are generated from a seeded random generator, so the same parameters always produce the same manual.
+
+Generate a manual from the command line with:
+
+    python -m benchmarks.manual <path to content folder> --sections 5 --chapters 4 --pages 5
+
+    Objects in this module
+    ----------------------
+    - generate_manual (function)
+    - generate_page (function)
+    - SECTION_MIX (constant)
+"""
+
+import random
+import argparse
+from pathlib import Path
+
+
+# Relative weight of each section type within the generated pages
+SECTION_MIX = {
+    'markdown': 6,
+    'table': 2,
+    'flextable': 1,
+    'card': 1,
+    'collapsible': 1,
+    'container': 1,
+}
+
+WORDS = ('the request is processed by the student desk after the deadline '
+         'application enrolment tuition fee programme course exam result '
+         'registration form document check approve reject archive').split()
+
+PROPERTIES = """[PROPERTIES]
+# Properties
+name = Benchmark manual
+version = 0
+language = en
+tbd = This page has no content yet.
+
+# Footer
+footer_contact = **Student desk**
+    Example street 1
+footer_info = Generated for *benchmarking*"""
+
+
+def generate_manual(path_content, sections=5, chapters=4, pages=5,
+                    sections_per_page=8, crossrefs_per_page=2,
+                    section_mix=None, seed=0):
+    """
+    Generate a synthetic manual in the content folder.
+
+    -----
+    :param path_content: Path to the content folder (created if it does not exist).
+    :param sections: Number of sections (besides the home section).
+    :param chapters: Number of chapters per section.
+    :param pages: Number of pages per chapter.
+    :param sections_per_page: Number of page sections in every page.
+    :param crossrefs_per_page: Average number of crossrefs in every page.
+    :param section_mix: Relative weight of each section type as dictionary (defaults to SECTION_MIX).
+    :param seed: Seed of the random generator.
+    :returns: Number of pages generated.
+    """
+
+    import pandas as pd
+
+    path_content = Path(path_content)
+    path_content.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    section_mix = section_mix or SECTION_MIX
+
+    rows = [dict(Page_id='home0', Section_order=0, Section='Home',
+                 Chapter_order=1, Chapter=None, Group_order=1, Group=None,
+                 Page_order=1, Page='Home', Code='HOME')]
+    for section in range(1, sections + 1):
+        for chapter in range(1, chapters + 1):
+            for page in range(1, pages + 1):
+                number = len(rows)
+                rows.append(dict(Page_id=f'p{number:04}',
+                                 Section_order=section,
+                                 Section=f'Section {section}',
+                                 Chapter_order=chapter,
+                                 Chapter=f'Chapter {chapter}',
+                                 Group_order=1,
+                                 Group=None,
+                                 Page_order=page,
+                                 Page=f'Page {number}',
+                                 Code=f'C{number}' if number % 2 else None))
+
+    codes = [row['Code'] for row in rows if row['Code']]
+    for row in rows:
+        text = generate_page(rng, codes, sections_per_page,
+                             crossrefs_per_page, section_mix)
+        path_section = path_content / f"{row['Section_order']:02}_{row['Section'].lower()}"
+        order = f"{row['Chapter_order']:02}{row['Group_order']:02}{row['Page_order']:02}"
+        elements = filter(None, [order, row['Chapter'], row['Page']])
+        filename = ' - '.join(elements).lower() + '.md'
+        path_section.mkdir(exist_ok=True)
+        (path_section / filename).write_text(f"{row['Page_id']}\n{text}",
+                                             encoding='utf-8')
+
+    df = pd.DataFrame(rows).set_index('Page_id')
+    df.to_excel(path_content / 'structure.xlsx', 'site structure')
+    (path_content / 'properties.ini').write_text(PROPERTIES)
+    return len(rows)
+
+
+def generate_page(rng, codes, sections_per_page=8, crossrefs_per_page=2,
+                  section_mix=None):
+    """
+    Generate the text of a page.
+
+    -----
+    :param rng: random.Random instance.
+    :param codes: Crossref codes to choose from.
+    :param sections_per_page: Number of page sections.
+    :param crossrefs_per_page: Average number of crossrefs in the page.
+    :param section_mix: Relative weight of each section type as dictionary (defaults to SECTION_MIX).
+    :returns: Page text as string.
+    """
+
+    section_mix = section_mix or SECTION_MIX
+    functions = rng.choices(list(section_mix),
+                            weights=list(section_mix.values()),
+                            k=sections_per_page)
+    # Spread the crossrefs over the markdown sections
+    crossrefs = [0] * sections_per_page
+    markdown_sections = [idx for idx, function in enumerate(functions)
+                         if function == 'markdown'] or [0]
+    for _ in range(crossrefs_per_page):
+        crossrefs[rng.choice(markdown_sections)] += 1
+
+    sections = list()
+    for function, number_of_crossrefs in zip(functions, crossrefs):
+        refs = ' '.join(f'[{rng.choice(codes)}]' for _ in range(number_of_crossrefs))
+        sections.append(SECTION_GENERATORS[function](rng, refs))
+    return '_____\n'.join(sections)
+
+
+def _sentence(rng, length=12):
+    words = rng.choices(WORDS, k=length)
+    if rng.random() < 0.3:
+        words[0] = f'**{words[0]}**'
+    return ' '.join(words).capitalize() + '.'
+
+
+def _markdown(rng, refs):
+    paragraphs = [' '.join(_sentence(rng) for _ in range(rng.randint(1, 4)))
+                  for _ in range(rng.randint(1, 3))]
+    items = [f'- {_sentence(rng, 5)}' for _ in range(rng.randint(0, 4))]
+    text = f'### {_sentence(rng, 3)}\n' + '\n\n'.join(paragraphs)
+    if items:
+        text += '\n\n' + '\n'.join(items)
+    return f'{text} {refs}\n'
+
+
+def _cell(rng):
+    kind = rng.random()
+    if kind < 0.3:
+        return str(rng.randint(0, 1000))
+    elif kind < 0.4:
+        return f'{rng.random() * 100:.2f}'
+    elif kind < 0.55:
+        return f"'*{rng.choice(WORDS)}*, {rng.choice(WORDS)}'"
+    elif kind < 0.6:
+        return ''
+    return ' '.join(rng.choices(WORDS, k=rng.randint(1, 4)))
+
+
+def _csv(rng, columns, rows):
+    header = ', '.join(f'Column {idx}' for idx in range(1, columns + 1))
+    lines = [', '.join(_cell(rng) for _ in range(columns)) for _ in range(rows)]
+    return header + '\n' + '\n'.join(lines) + '\n'
+
+
+def _table(rng, refs):
+    return '|table\n' + _csv(rng, rng.randint(2, 6), rng.randint(3, 30))
+
+
+def _flextable(rng, refs):
+    return '|flextable\n' + _csv(rng, rng.randint(2, 4), rng.randint(2, 10))
+
+
+def _card(rng, refs):
+    lines = [f'{rng.choice(WORDS).capitalize()}, {_cell(rng)}'
+             for _ in range(rng.randint(2, 6))]
+    return '|card\n' + '\n'.join(lines) + '\n'
+
+
+def _collapsible(rng, refs):
+    items = [f'### {_sentence(rng, 3)}\n{_sentence(rng)}\n'
+             for _ in range(rng.randint(1, 4))]
+    return '|collapsible\n' + ''.join(items)
+
+
+def _container(rng, refs):
+    return f'|container:note\n{_sentence(rng)}\n'
+
+
+SECTION_GENERATORS = {
+    'markdown': _markdown,
+    'table': _table,
+    'flextable': _flextable,
+    'card': _card,
+    'collapsible': _collapsible,
+    'container': _container,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic manual')
+    parser.add_argument('path', help='path to the content folder')
+    parser.add_argument('--sections', type=int, default=5)
+    parser.add_argument('--chapters', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--sections_per_page', type=int, default=8)
+    parser.add_argument('--crossrefs_per_page', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    number_of_pages = generate_manual(args.path,
+                                      sections=args.sections,
+                                      chapters=args.chapters,
+                                      pages=args.pages,
+                                      sections_per_page=args.sections_per_page,
+                                      crossrefs_per_page=args.crossrefs_per_page,
+                                      seed=args.seed)
+    print(f'Generated {number_of_pages} pages in {args.path}.')
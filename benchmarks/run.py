@@ -0,0 +1,299 @@
+"""
+The run module
+==============
+This module runs the benchmark suite of the site builder on a synthetic manual (see the manual module). It times:
+
+==================  ===========================================================
+Benchmark           Description
+==================  ===========================================================
+read_excel          Load the site structure from `structure.xlsx`.
+load_structure      Load the site structure from the cache of `structure.xlsx`.
+extract_sections    Split all md files into sections (`PageContent._extract_sections`).
+section:<function>  Render all sections of a type with the section_processing function.
+build               Full run of the build site script (in a separate process).
+==================  ===========================================================
+
+Every benchmark is repeated a number of times and the minimum, median and mean are stored. The results are written as json to the results folder (`benchmarks/results/<label>.json`) together with the commit, python version and machine they were measured on. Results of two versions can be compared with the 'compare' flag:
+
+    python -m benchmarks.run --label before
+    (check out the other version)
+    python -m benchmarks.run --label after --compare benchmarks/results/before.json
+
+Since the site builder reads `config.ini` from the working directory, the benchmarks are run from a working directory containing the synthetic manual and a matching `config.ini`. The caches of the site builder (compiled templates, parsed structure and rendered sections) are kept in the `cache` folder of the working directory. By default this folder is removed before every build, so every build starts cold. If flagged with 'warm', the caches are kept between the builds (the first build fills them). Whether the builds were warm is stored with the results.
+
+    Objects in this module
+    ----------------------
+    - prepare_workdir (function)
+    - run_benchmarks (function)
+    - time_function (function)
+    - time_build (function)
+    - compare_results (function)
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import datetime as dt
+from pathlib import Path
+
+PATH_REPO = Path(__file__).resolve().parent.parent
+PATH_RESULTS = PATH_REPO / 'benchmarks' / 'results'
+
+if str(PATH_REPO) not in sys.path:
+    sys.path.insert(0, str(PATH_REPO))
+
+from benchmarks import manual
+
+
+def prepare_workdir(workdir, **parameters):
+    """
+    Generate the synthetic manual in the working directory and write a `config.ini` that points to it. The cache folder of the site builder is set to the `cache` folder in the working directory.
+
+    -----
+    :param workdir: Path to the working directory.
+    :param parameters: Parameters passed to `manual.generate_manual`.
+    :returns: Number of pages generated.
+    """
+
+    workdir = Path(workdir)
+    path_content = workdir / 'content'
+    path_output = workdir / 'output'
+    if path_content.exists():
+        shutil.rmtree(path_content)
+    number_of_pages = manual.generate_manual(path_content, **parameters)
+    path_output.mkdir(parents=True, exist_ok=True)
+    config_ini = (f'[PATHS]\n'
+                  f'workdir = {PATH_REPO}\n'
+                  f'templates = {PATH_REPO / "templates"}\n'
+                  f'content = {path_content}\n'
+                  f'output = {path_output}\n'
+                  f'cache = {workdir / "cache"}\n')
+    (workdir / 'config.ini').write_text(config_ini)
+    return number_of_pages
+
+
+def time_function(function, repeat, setup=None):
+    """
+    Time a function.
+
+    -----
+    :param function: Function without arguments.
+    :param repeat: Number of repetitions.
+    :param setup: Optional function without arguments that is called (untimed) before every repetition.
+    :returns: Timings in seconds as dictionary (min, median, mean, runs).
+    """
+
+    timings = list()
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return _stats(timings)
+
+
+def time_build(workdir, repeat, build_args=None, warm=False):
+    """
+    Time full runs of the build site script. The output folder is emptied before every run, and so is the cache folder unless the builds are warm.
+
+    -----
+    :param workdir: Path to the working directory.
+    :param repeat: Number of repetitions.
+    :param build_args: Additional arguments for the build site script as list.
+    :param warm: Whether the cache folder is kept between the runs.
+    :returns: Timings in seconds as dictionary (min, median, mean, runs).
+    """
+
+    path_output = Path(workdir) / 'output'
+    path_cache = Path(workdir) / 'cache'
+    command = [sys.executable, str(PATH_REPO / 'build_site.py'), '--no_increment']
+    command += build_args or []
+
+    def clean_output():
+        shutil.rmtree(path_output, ignore_errors=True)
+        path_output.mkdir()
+        if not warm:
+            shutil.rmtree(path_cache, ignore_errors=True)
+
+    def build():
+        subprocess.run(command, cwd=workdir, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    return time_function(build, repeat, setup=clean_output)
+
+
+def run_benchmarks(workdir, repeat=5, builds=3, build_args=None, warm=False):
+    """
+    Run the benchmarks on the manual in the working directory. The site_builder package is imported from within the working directory, so it picks up the `config.ini` written by `prepare_workdir`.
+
+    -----
+    :param workdir: Path to the working directory.
+    :param repeat: Number of repetitions of the benchmarks within this process.
+    :param builds: Number of full builds.
+    :param build_args: Additional arguments for the build site script as list.
+    :param warm: Whether the caches are kept between the full builds.
+    :returns: Timings per benchmark as dictionary.
+    """
+
+    os.chdir(workdir)
+    from site_builder import site_specs
+    from site_builder import page_loader
+    from site_builder import page_builder
+    from site_builder import section_processing
+
+    path_content = Path(workdir) / 'content'
+    results = dict()
+
+    results['read_excel'] = time_function(
+        lambda: site_specs.read_excel(path_content / 'structure.xlsx'),
+        repeat)
+    if hasattr(site_specs, 'load_structure'):
+        site_specs.load_structure(path_content / 'structure.xlsx')
+        results['load_structure'] = time_function(
+            lambda: site_specs.load_structure(path_content / 'structure.xlsx'),
+            repeat)
+
+    texts = [path.read_text(encoding='utf-8').split('\n', 1)[1]
+             for path in sorted(path_content.glob('**/*.md'))]
+    results['extract_sections'] = time_function(
+        lambda: [page_loader.PageContent._extract_sections(text) for text in texts],
+        repeat)
+
+    sections = dict()
+    for text in texts:
+        for section in page_loader.PageContent._extract_sections(text):
+            sections.setdefault(section['function'], list()).append(section)
+
+    def clear_caches():
+        cell_markdown = getattr(section_processing, '_cell_markdown', None)
+        if cell_markdown is not None:
+            cell_markdown.cache_clear()
+
+    dispatcher = page_builder.PageBuilder.dispatcher
+    for function, items in sorted(sections.items()):
+        results[f'section:{function}'] = time_function(
+            lambda: [dispatcher(item['text'], item['function'], item['arg'])
+                     for item in items],
+            repeat,
+            setup=clear_caches)
+
+    results['build'] = time_build(workdir, builds, build_args, warm)
+    return results
+
+
+def compare_results(base, current):
+    """
+    Print the timings of two benchmark runs side by side.
+
+    -----
+    :param base: Results of the base run as dictionary.
+    :param current: Results of the current run as dictionary.
+    :returns: None
+    """
+
+    if base.get('warm', False) != current.get('warm', False):
+        print('\nWarning: the builds of one run were warm and of the other run cold.')
+    print(f"\n{'benchmark':<24}  {base['label']:>12}  {current['label']:>12}  {'ratio':>7}")
+    for name, timing in current['timings'].items():
+        base_timing = base['timings'].get(name)
+        if base_timing is None:
+            print(f"{name:<24}  {'-':>12}  {timing['median']:>12.4f}  {'-':>7}")
+            continue
+        ratio = timing['median'] / base_timing['median']
+        print(f"{name:<24}  {base_timing['median']:>12.4f}  {timing['median']:>12.4f}  {ratio:>7.2f}")
+
+
+def _stats(timings):
+    return dict(min=min(timings),
+                median=statistics.median(timings),
+                mean=statistics.mean(timings),
+                runs=len(timings))
+
+
+def _commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                cwd=PATH_REPO, capture_output=True,
+                                text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return output.stdout.strip()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the site builder benchmarks')
+    parser.add_argument('--label', help='name of the results file (defaults to the current commit)')
+    parser.add_argument('--sections', type=int, default=5)
+    parser.add_argument('--chapters', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--sections_per_page', type=int, default=8)
+    parser.add_argument('--crossrefs_per_page', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', help='number of repetitions of the benchmarks', type=int, default=5)
+    parser.add_argument('--builds', help='number of full builds', type=int, default=3)
+    parser.add_argument('--build_args', help='additional arguments for the build site script', default='')
+    parser.add_argument('--warm', help='set flag to keep the caches of the site builder between the full builds', action='store_true')
+    parser.add_argument('--workdir', help='working directory for the synthetic manual (defaults to a temporary directory)')
+    parser.add_argument('--compare', help='path to the results of a previous run to compare with', metavar='PATH')
+    args = parser.parse_args()
+
+    parameters = dict(sections=args.sections,
+                      chapters=args.chapters,
+                      pages=args.pages,
+                      sections_per_page=args.sections_per_page,
+                      crossrefs_per_page=args.crossrefs_per_page,
+                      seed=args.seed)
+    commit = _commit()
+    label = args.label or commit
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='site_builder_bench_')).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    number_of_pages = prepare_workdir(workdir, **parameters)
+    print(f'Generated {number_of_pages} pages in {workdir}.')
+
+    cwd = os.getcwd()
+    try:
+        timings = run_benchmarks(workdir,
+                                 repeat=args.repeat,
+                                 builds=args.builds,
+                                 build_args=args.build_args.split(),
+                                 warm=args.warm)
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = dict(
+        label=label,
+        commit=commit,
+        date=dt.datetime.now().isoformat(timespec='seconds'),
+        python=platform.python_version(),
+        machine=platform.platform(),
+        processor=platform.processor() or platform.machine(),
+        cpu_count=os.cpu_count(),
+        parameters=dict(parameters, pages_total=number_of_pages),
+        warm=args.warm,
+        timings=timings,
+        )
+
+    PATH_RESULTS.mkdir(parents=True, exist_ok=True)
+    path_results = PATH_RESULTS / f'{label}.json'
+    with open(path_results, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+
+    print(f"\n{'benchmark':<24}  {'min':>10}  {'median':>10}  {'mean':>10}")
+    for name, timing in timings.items():
+        print(f"{name:<24}  {timing['min']:>10.4f}  {timing['median']:>10.4f}  {timing['mean']:>10.4f}")
+    print(f'\nResults written to {path_results}.')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_results(json.load(f), results)
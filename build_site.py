@@ -4,7 +4,18 @@ The build_structure script
 This script will build the site in the output folder designated in `config.ini`. Any time you run the build site script it will increment the build number (which is printed in the footer of the page). If you want to run this script without incrementing the build number, flag it with 'no_increment'.
 
 - The script will render all .md files with a valid page id in the content folder and store them in the output folder.
-- It will copy the iframes and images folders to the output folder.
+- If flagged with 'output_format', the html is written as 'pretty' (the default, set in `config.ini`), 'raw' or 'minified' (see the html_format module).
+- If flagged with 'stylesheets', the stylesheets used by the pages are written as 'plain' (the default, set in `config.ini`), 'hashed' or 'bundled' (see the stylesheets module).
+- If flagged with 'jobs N', the pages are rendered by a pool of N worker processes. The md files are found and handed to the pool lazily, with at most 'max_in_flight' pages in flight, so the memory used does not depend on the size of the site.
+- If flagged with 'reproducible', the dates on the pages and the sitemap are taken from the git history of the content folder and SOURCE_DATE_EPOCH instead of the file system and the clock, so building the same content gives the same output (see the timestamps module). This is also the case if SOURCE_DATE_EPOCH is set or if `reproducible` is set in `config.ini`. Since the build number is printed on every page, combine this flag with 'no_increment'.
+- If flagged with 'incremental', it will only render the pages whose inputs have changed since the last build (see the manifest module). Since the build number is printed on every page, combine this flag with 'no_increment' to benefit from it.
+- If flagged with 'profile', it will record the time and memory allocation of every phase of the build per page and section function (see the profiling module). The report is written as json (to `build_profile.json` unless a path is given) and the top N phases and pages are printed (set N with 'profile_top' and the sort order with 'profile_sort').
+- If flagged with 'dependencies', it will print the templates and snippets every page depends on (as recorded in the manifest of the last incremental build) and exit without building. If a template name (e.g. 'snippet_card') is given, it prints the pages that depend on it; if a page id or href is given, it prints the templates that page depends on.
+- If flagged with 'watch', it will keep running after the build: the output folder is served at http://localhost:8000/ (set the port with 'port') and the affected pages are rebuilt whenever the content or templates folders change (see the watch module). Pages in the browser reload automatically after a rebuild.
+- It will write the search index of the site, which is searched with the search widget in the navigation bar (see the search module). Only the shards of the sections with changed pages are written. If flagged with 'no_search', the search index and widget are left out (the default is set with `search` in `config.ini`).
+- It will synchronize the iframes and images folders of the output folder with the content folder: only new and changed files are copied (or linked, see `asset_link` in `config.ini`) and removed files are removed (see the assets module).
+- It will store the rendered sections in the cache folder, so sections that occur on many pages (or did not change since the last build) are rendered once (see the section_cache module).
+- It will only write the pages that changed, so the modification times of unchanged pages are preserved (see the outputs module). The pages are written by a writer thread while the next pages are rendered.
 - It will store `properties.ini` with the updated build version in the content folder.
 """
 
@@ -12,97 +23,135 @@ import timeit
 start = timeit.default_timer()
 
 import argparse
-import shutil
-from site_builder import config
-from site_builder import site_specs
-from site_builder import page_loader
-from site_builder import page_builder
-
-
-path_templates = config.PATH_CONFIG['templates']
-path_content = config.PATH_CONFIG['content']
-path_output = config.PATH_CONFIG['output']
-
-# Load site properties
-parser = argparse.ArgumentParser(description='Build static site')
-parser.add_argument('--no_increment', help='set flag if version number should not be incremented', action='store_true')
-args = parser.parse_args()
-site_specs.SiteProperties.load_properties(no_increment=args.no_increment)
-
-# Load site structure
-structure = site_specs.read_excel(path_content / 'structure.xlsx')
-page_builder.PageBuilder.structure = structure
-
-# Pages
-for file in path_content.glob('**/*.md'):
-    content = page_loader.read_md(file, structure.page_ids)
-    href = structure[content.page_id]['Href']
-    page = page_builder.PageBuilder(content)
-    output_html = page.build_page()
-    full_path = path_output / href
-    path_out = full_path.parent
-
-    if not path_out.exists():
-        path_out.mkdir(parents=True)
-
-    with open(full_path, 'w', encoding='utf-8') as f:
-        f.write(output_html)
-
-# Sitemap
-output_html = page_builder.PageBuilder.build_sitemap()
-full_path = path_output / 'sitemap.html'
-with open(full_path, 'w', encoding='utf-8') as f:
-    f.write(output_html)
-
-# Iframes
-path_src = path_content / 'iframes'
-path_dst = path_output / 'iframes'
-if path_src.exists():
-    if not path_dst.exists():
-        shutil.copytree(path_src, path_dst)
-
-# Images
-path_src = path_content / 'images'
-path_dst = path_output / 'images'
-if path_src.exists():
-    if not path_dst.exists():
-        shutil.copytree(path_src, path_dst)
-
-# CSS files
-output_css = ''
-path_css = path_output / 'css'
-if not path_css.exists():
-    path_css.mkdir(parents=True)
-
-css_files = [
-    'styles_card.css',
-    'styles_collapsible.css',
-    'styles_table.css',
-    'styles_flextable.css',
-    'styles_iframe.css',
-    'styles_sitemap.css',
-    ]
-
-for css_file in css_files:
-    in_file = path_templates / css_file
-    out_file = path_css / css_file
-    shutil.copy(in_file, path_css)
-
-css_files = [
-    'styles_base.css',
-    'styles_custom_formatting.css'
-    ]
-for css_file in css_files:
-    css_path = path_templates / css_file
-    output_css += css_path.read_text()
-full_path = path_css / 'styles_base.css'
-with open(full_path, 'w', encoding='utf-8') as f:
-    f.write(output_css)
-
-# Save ini with incremented build version number
-with open(path_content / 'properties.ini', 'w') as f:
-    f.write(site_specs.SiteProperties.create_ini())
-
-stop = timeit.default_timer()
-time = stop - start
-print(f'Finished in {time:.2f} sec.')
+from site_builder import html_format
+from site_builder import stylesheets
+from site_builder import profiling
+
+
+if __name__ == '__main__':
+    # Parse the arguments before importing the rest of the site builder, so --help is fast
+    parser = argparse.ArgumentParser(description='Build static site')
+    parser.add_argument('--no_increment', help='set flag if version number should not be incremented', action='store_true')
+    parser.add_argument('--incremental', help='set flag to only render pages whose inputs changed since the last build', action='store_true')
+    parser.add_argument('--jobs', help='number of processes used for rendering pages', type=int, default=1)
+    parser.add_argument('--max_in_flight', help='maximum number of pages handed to the worker processes at the same time (default: 8 per job)', type=int, default=None)
+    parser.add_argument('--output_format', help='format of the html output (defaults to the output format in config.ini)', choices=html_format.OUTPUT_FORMATS, default=None)
+    parser.add_argument('--stylesheets', help='how stylesheets are written (defaults to the stylesheet mode in config.ini)', choices=stylesheets.STYLESHEET_MODES, default=None)
+    parser.add_argument('--reproducible', help='set flag to take the dates on the pages from the git history and SOURCE_DATE_EPOCH, so the output can be reproduced', action='store_true', default=None)
+    parser.add_argument('--no_search', help='set flag to leave out the search index and search widget', action='store_true')
+    parser.add_argument('--dependencies', help='print the dependencies recorded in the manifest (of a template, page id or href) and exit', nargs='?', const='', default=None, metavar='NAME')
+    parser.add_argument('--watch', help='set flag to serve the output folder and rebuild the site on changes', action='store_true')
+    parser.add_argument('--port', help='port used for serving the output folder in watch mode', type=int, default=8000)
+    parser.add_argument('--profile', help='set flag to write a profiling report (optionally to the given path)', nargs='?', const='build_profile.json', default=None, metavar='PATH')
+    parser.add_argument('--profile_top', help='number of phases and pages printed in the profiling report', type=int, default=10)
+    parser.add_argument('--profile_sort', help='sort order of the profiling report', choices=profiling.SORT_KEYS, default='time')
+    args = parser.parse_args()
+
+    from site_builder import config
+    from site_builder import site_specs
+    from site_builder import page_builder
+    from site_builder import manifest
+    from site_builder import outputs
+    from site_builder import build
+
+    config.load_config()
+    path_templates = config.PATH_CONFIG['templates']
+    path_content = config.PATH_CONFIG['content']
+    path_output = config.PATH_CONFIG['output']
+
+    if args.dependencies is not None:
+        build_manifest = manifest.BuildManifest(path_output / '.build_manifest.json')
+        manifest.print_dependencies(build_manifest, args.dependencies or None)
+        raise SystemExit
+    if args.profile:
+        profiling.enable()
+
+    # Load site properties, templates and stylesheets
+    build.init_build(output_format=args.output_format,
+                     no_increment=args.no_increment,
+                     stylesheet_mode=args.stylesheets,
+                     search_index=False if args.no_search else None,
+                     reproducible=args.reproducible)
+
+    # Load site structure
+    with profiling.measure('structure'):
+        structure = site_specs.load_structure(path_content / config.BUILD_CONFIG['structure_file'])
+    page_builder.PageBuilder.structure = structure
+
+    # Pages
+    build_manifest = None
+    if args.incremental or args.watch:
+        build_manifest = manifest.BuildManifest(path_output / '.build_manifest.json')
+    output_hashes = outputs.OutputHashes(path_output / '.output_hashes.json')
+
+    # Only the hrefs, page ids and (distinct) stylesheets of the pages are kept
+    pages = dict()
+    rendered_hrefs = set()
+    stylesheet_sets = set()
+    written = 0
+    for result in build.iter_pages(build.find_pages(path_content),
+                                   structure,
+                                   path_output,
+                                   jobs=args.jobs,
+                                   build_manifest=build_manifest,
+                                   output_hashes=output_hashes,
+                                   max_in_flight=args.max_in_flight):
+        for code in result.unresolved:
+            print(f'Unresolved crossref [{code}] on page {result.page_id} ({result.href}).')
+        pages[result.href] = result.page_id
+        if result.rendered:
+            rendered_hrefs.add(result.href)
+        stylesheet_sets.add(tuple(result.stylesheets))
+        written += result.written
+    hrefs = list(pages)
+    rendered = len(rendered_hrefs)
+
+    if build_manifest is not None:
+        build_manifest.retain(hrefs)
+        build_manifest.save()
+        print(f'Rendered {rendered} pages, skipped {len(hrefs) - rendered} unchanged pages.')
+
+    # Sitemap
+    with profiling.measure('sitemap'):
+        build.write_sitemap(path_output, output_hashes)
+    output_hashes.retain(hrefs + [build.SITEMAP])
+    output_hashes.save()
+    print(f'Wrote {written} pages, {len(hrefs) - written} pages were unchanged.')
+
+    # Search index
+    with profiling.measure('search'):
+        shards = build.write_search_index(path_output, pages.items(), rendered_hrefs)
+    if shards:
+        print(f'Wrote search index for {len(shards)} sections.')
+
+    # Iframes and images
+    with profiling.measure('assets'):
+        synced = build.copy_assets(path_content, path_output)
+    if synced.copied or synced.removed:
+        print(f'Copied {synced.copied} assets, removed {synced.removed} stale assets.')
+
+    # CSS files
+    with profiling.measure('css'):
+        build.copy_stylesheets(path_output, stylesheet_sets)
+
+    # Keep the cache of rendered sections within its maximum size
+    with profiling.measure('section_cache'):
+        build.evict_section_cache()
+
+    # Save ini with incremented build version number
+    with open(path_content / 'properties.ini', 'w') as f:
+        f.write(site_specs.SiteProperties.create_ini())
+
+    stop = timeit.default_timer()
+    time = stop - start
+    print(f'Finished in {time:.2f} sec.')
+
+    if args.profile:
+        profiling.write_report(args.profile, sort=args.profile_sort)
+        profiling.print_report(top=args.profile_top, sort=args.profile_sort)
+        print(f'Profiling report written to {args.profile}.')
+
+    if args.watch:
+        from site_builder import watch
+        watch.watch(path_content, path_templates, path_output, build_manifest,
+                    output_hashes, port=args.port)
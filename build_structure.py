@@ -5,26 +5,36 @@ This script builds or rebuilds the site structure within the content folder acco
 
 1. Try to read the site structure from `structure.xlsx` in the content folder. If this fails it will create an empty structure table (with only a homepage) and store it in the content folder.
 2. Check if any rows lack a page_id and if so create and add unique page_ids to these rows.
-3. Loop over the .md files in the content folder and for every file:
+3. Read the page_id (the first line) of every .md file in the content folder. Only the first line is read and the files are read by a pool of threads.
+4. Plan the changes for every file (the target paths of all pages are computed from the table in one go):
     - Check the page_id; if a page_id is found that is unknown to the site structure definition, then prompt the user to delete the file. (Files with page_ids that are not defined in the site structure are ignored when building the site. Thus they can be safely left within the content folder. However this may later lead to confusion when maintaining the site.)
     - Check if each path and filename follows this naming convention:
 
         [ content folder / section_order + section / chapter_order + group_order + page_order + page_name ]
 
     if not: rename the path and/or filename.
-4. Check if all page_ids have an associated .md file. If this is not the case:
-    - Create the .md file following the naming convention above.
-5. Save the updated table in `structure.xlsx`.
+    - Check if all page_ids have an associated .md file. If this is not the case: create the .md file following the naming convention above.
+    - Check that no two files end up at the same path. A rename or new file whose path is also the target of another page, or is taken by a file that is not renamed, is reported as a conflict and left out.
+5. Print the planned changes and carry them out. Files that are renamed to the current path of another renamed file (such as two files swapping names) are first moved to a temporary name, so no file is overwritten. If flagged with 'dry_run', the planned changes are only printed and nothing is changed.
+6. Save the updated table in `structure.xlsx`.
 
 This script can add page ids where they are missing but other than that the site structure must be well formatted. At this point in time there is no other validation performed on the structure table. This means that the order for each page needs to be fully specified. Make sure that section_oder, chapter_order and group_order are filled for each page. If there are no groups within a chapter or no chapters within a section the order value should be 1.
 
 Another thing to note is that this script will organize the .md files into folders for convenience only. Where the .md files are stored has no bearing on how the site is actually built. You could move the files around and it would make no difference - as long as the site builder is able to find the relevant files.
 """
 
+import os
+import argparse
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from site_builder import config
 
 
+Plan = namedtuple('Plan', ['renames', 'creates', 'unknown', 'duplicates', 'conflicts'])
+
+
 def generate_id(page_ids):
     """
     Generate a unique id.
@@ -40,7 +50,159 @@ def generate_id(page_ids):
     return new_id
 
 
+def read_page_id(file_path):
+    """
+    Read the page_id from the first line of an md file (without reading the rest of the file).
+
+    :param file_path: Path to the md file.
+    :returns: Page_id as string or None if the file has no valid page_id.
+    """
+    with open(file_path, encoding='utf-8') as f:
+        line = f.readline()
+    if not line.endswith('\n'):
+        return None
+    page_id = line[:-1]
+    if not len(page_id) == 5:
+        return None
+    return page_id
+
+
+def target_paths(df, path_content):
+    """
+    Compute the path of the md file of every page according to the naming convention.
+
+    :param df: Site structure table indexed by page_id.
+    :param path_content: Path to the content folder.
+    :returns: Series of paths indexed by page_id.
+    """
+    def order(column):
+        return df[column].map('{:02}'.format)
+
+    def name(column):
+        return df[column].astype(str).str.lower()
+
+    chapter = name('Chapter')
+    page_name = name('Page')
+    folders = order('Section_order') + '_' + name('Section')
+    filenames = (order('Chapter_order') + order('Group_order') + order('Page_order')
+                 + np.where(chapter != '', ' - ' + chapter, '')
+                 + np.where(page_name != '', ' - ' + page_name, '')
+                 + '.md')
+    return pd.Series([path_content / folder / filename
+                      for folder, filename in zip(folders, filenames)],
+                     index=df.index)
+
+
+def plan_changes(df, files, page_ids, path_content):
+    """
+    Plan the changes to the md files in the content folder without touching the file system.
+
+    :param df: Site structure table indexed by page_id.
+    :param files: Paths to the md files.
+    :param page_ids: Page_ids of the md files (None for files without a valid page_id).
+    :param path_content: Path to the content folder.
+    :returns: Plan with the renames (source, target), creates (page_id, target), files with an unknown page_id (path, page_id), files with a page_id that was already found (path, page_id) and conflicting renames and creates (source path or page_id, target).
+    """
+    targets = target_paths(df, path_content)
+    plan = Plan(list(), list(), list(), list(), list())
+    found_page_ids = set()
+    for file_path, page_id in sorted(zip(files, page_ids)):
+        if page_id is None:
+            continue
+        if page_id not in targets.index:
+            plan.unknown.append((file_path, page_id))
+        elif page_id in found_page_ids:
+            plan.duplicates.append((file_path, page_id))
+        else:
+            found_page_ids.add(page_id)
+            if not file_path == targets[page_id]:
+                plan.renames.append((file_path, targets[page_id]))
+    for page_id in df.index:
+        if page_id not in found_page_ids:
+            plan.creates.append((page_id, targets[page_id]))
+
+    # A target may not be claimed twice, nor be taken by a file that stays where it is
+    # Leaving out a conflicting rename keeps its file in place, which may cause new conflicts
+    claimed = Counter(target for _, target in plan.renames + plan.creates)
+    while True:
+        taken = set(files) - {file_path for file_path, _ in plan.renames}
+        conflicts = [(source, target) for source, target in plan.renames + plan.creates
+                     if claimed[target] > 1 or target in taken]
+        if not conflicts:
+            return plan
+        plan.conflicts.extend(conflicts)
+        for changes in [plan.renames, plan.creates]:
+            changes[:] = [change for change in changes if change not in conflicts]
+
+
+def print_plan(plan, path_content):
+    """
+    Print the planned changes as a diff of the content folder.
+
+    :param plan: Plan as returned by plan_changes.
+    :param path_content: Path to the content folder.
+    :returns: None
+    """
+    def relative(path):
+        return path.relative_to(path_content)
+
+    for file_path, target in plan.renames:
+        print(f'R {relative(file_path)} -> {relative(target)}')
+    for page_id, target in plan.creates:
+        print(f'A {relative(target)} <{page_id}>')
+    for file_path, page_id in plan.unknown:
+        print(f'? {relative(file_path)} <{page_id}> (unknown page id)')
+    for file_path, page_id in plan.duplicates:
+        print(f'! {relative(file_path)} <{page_id}> (page id already used by another file, left as is)')
+    for source, target in plan.conflicts:
+        source = relative(source) if isinstance(source, os.PathLike) else f'<{source}>'
+        print(f'C {source} -> {relative(target)} (path already used by another page or file, left as is)')
+    if not any(plan):
+        print('The content folder matches the site structure.')
+
+
+def apply_plan(plan):
+    """
+    Carry out the planned changes: prompt the user to delete files with unknown page ids, rename the files and create the files for new pages. Files whose target is the current path of another renamed file are renamed in two steps through a temporary name, so swaps and chains of renames do not overwrite files.
+
+    :param plan: Plan as returned by plan_changes.
+    :returns: None
+    """
+    for file_path, page_id in plan.unknown:
+        delete = None
+        while not delete in ['y', 'j', 'n']:
+            delete = input(
+                f"File '{file_path.name}' has unknown page id <{page_id}>. Delete (y/n)? ")
+            delete = delete.lower()[0]
+        if not delete == 'n':
+            print(f'Deleting {file_path.name}.')
+            file_path.unlink()
+
+    folders = {target.parent for _, target in plan.renames + plan.creates}
+    for folder in folders:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    sources = {file_path for file_path, _ in plan.renames}
+    moved = list()
+    for file_path, target in plan.renames:
+        if target in sources:
+            path_tmp = file_path.with_name(f'.{file_path.name}.{os.getpid()}.tmp')
+            file_path.rename(path_tmp)
+            moved.append((path_tmp, target))
+        else:
+            file_path.rename(target)
+    for path_tmp, target in moved:
+        path_tmp.rename(target)
+
+    for page_id, target in plan.creates:
+        target.write_text(page_id + '\n', encoding='utf-8')
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build site structure')
+    parser.add_argument('--dry_run', help='set flag to only print the planned changes', action='store_true')
+    args = parser.parse_args()
+
     path_templates = config.PATH_CONFIG['templates']
     path_content = config.PATH_CONFIG['content']
 
@@ -65,76 +227,18 @@ if __name__ == '__main__':
     df['Page_id'] = df['Page_id'].apply(lambda x: generate_id(page_ids) if pd.isna(x) else x)
     df = df.set_index('Page_id').fillna(value='')
 
-    # Rename existing files according to site structure spec
-    # Prompt to delete files with unknown page ids
-    # Store found page ids
-    found_page_ids = list()
-    files = path_content.glob('**/*.md')
-    for file_path in files:
-        text = file_path.read_text(encoding='utf-8')
-        if not '\n' in text:
-            continue
+    # Read the page ids of the md files
+    files = list(path_content.glob('**/*.md'))
+    with ThreadPoolExecutor() as pool:
+        file_page_ids = list(pool.map(read_page_id, files))
 
-        page_id, text_body = text.split('\n', 1)
-        if not len(page_id) == 5:
-            continue
-
-        if page_id not in page_ids:
-            delete = None
-            while not delete in ['y', 'j', 'n']:
-                delete = input(
-                    f"File '{file_path.name}' has unknown page id <{page_id}>. Delete (y/n)? ")
-                delete = delete.lower()[0]
-            if not delete == 'n':
-                print(f'Deleting {file_path.name}.')
-                file_path.unlink()
-            continue
+    # Plan renames and new files, and show them before changing anything
+    plan = plan_changes(df, files, file_page_ids, path_content)
+    print_plan(plan, path_content)
+    if args.dry_run:
+        raise SystemExit
 
-        found_page_ids.append(page_id)
-
-        section_order = f"{df.loc[page_id]['Section_order']:02}"
-        chapter_order = f"{df.loc[page_id]['Chapter_order']:02}"
-        group_order = f"{df.loc[page_id]['Group_order']:02}"
-        page_order = f"{df.loc[page_id]['Page_order']:02}"
-        section = df.loc[page_id]['Section'].lower()
-        chapter = df.loc[page_id]['Chapter'].lower()
-        page_name = df.loc[page_id]['Page'].lower()
-
-        path_section = (section_order + '_' + section)
-        order = chapter_order + group_order + page_order
-        fn_elements = list(filter(None, [order, chapter, page_name]))
-
-        filename = ' - '.join(fn_elements) + '.md'
-
-        renamed_path = path_content / path_section / filename
-        if not file_path == renamed_path:
-            if not renamed_path.parent.exists():
-                renamed_path.parent.mkdir(parents=True)
-            file_path.rename(renamed_path)
-
-    # Create files for new page ids
-    new_page_ids = set(df.index.values) - set(found_page_ids)
-    for page_id in new_page_ids:
-        section_order = f"{df.loc[page_id]['Section_order']:02}"
-        chapter_order = f"{df.loc[page_id]['Chapter_order']:02}"
-        group_order = f"{df.loc[page_id]['Group_order']:02}"
-        page_order = f"{df.loc[page_id]['Page_order']:02}"
-        section = df.loc[page_id]['Section'].lower()
-        chapter = df.loc[page_id]['Chapter'].lower()
-        page_name = df.loc[page_id]['Page'].lower()
-
-        path_section = (section_order + '_' + section)
-        order = chapter_order + group_order + page_order
-        fn_elements = list(filter(None, [order, chapter, page_name]))
-
-        filename = ' - '.join(fn_elements) + '.md'
-        file_path = path_content / path_section / filename
-
-        if not file_path.parent.exists():
-            file_path.parent.mkdir(parents=True)
-
-        text = page_id + '\n'
-        file_path.write_text(text, encoding='utf-8')
+    apply_plan(plan)
 
     # Save structure file
     writer = pd.ExcelWriter(structure_file)
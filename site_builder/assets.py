@@ -0,0 +1,200 @@
+"""
+The assets module
+=================
+This module synchronizes the asset folders (iframes and images) of the content folder with the output folder. Instead of copying a folder once (and never again), every build compares the files in both folders and only touches the files that differ:
+
+===============  ==============================================================
+Source file      Action
+===============  ==============================================================
+new              Copy (or link) the file to the output folder.
+same size/mtime  Skip the file.
+same size        Hash both files: skip if the contents are equal (the modification time is updated), otherwise copy.
+other size       Copy (or link) the file to the output folder.
+removed          Remove the file from the output folder.
+===============  ==============================================================
+
+How files are copied is set with `asset_link` in the BUILD section of `config.ini`:
+
+=========  ===================================================================
+Value      Description
+=========  ===================================================================
+reflink    Clone the file (copy-on-write) if the filesystem supports it, else copy it. This is the default.
+hardlink   Hardlink the file if the filesystem allows it, else clone or copy it. The output shares the file with the content folder, so nothing is copied at all.
+copy       Always copy the file.
+=========  ===================================================================
+
+Files are written to a temporary file in the output folder which then replaces the old file, so an output file that is hardlinked to a source file is never written through. Comparing and copying the files is done by a pool of threads, since the work is bound by I/O.
+
+    Objects in this module
+    ----------------------
+    - SyncResult (class)
+    - sync_folder (function)
+    - sync_file (function)
+    - list_files (function)
+    - hash_file (function)
+    - LINK_MODES (constant)
+"""
+
+import os
+import errno
+import shutil
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+LINK_MODES = ['reflink', 'hardlink', 'copy']
+FICLONE = 0x40049409  # ioctl request for cloning a file on Linux (btrfs, xfs)
+CHUNK_SIZE = 1024 * 1024
+
+SyncResult = namedtuple('SyncResult', ['copied', 'unchanged', 'removed'])
+
+
+def sync_folder(path_src, path_dst, link='reflink', threads=None):
+    """
+    Synchronize the destination folder with the source folder: copy new and changed files and remove files (and folders) that are not in the source folder.
+
+    -----
+    :param path_src: Path to the source folder.
+    :param path_dst: Path to the destination folder.
+    :param link: How files are copied (one of LINK_MODES).
+    :param threads: Number of threads (defaults to the default of ThreadPoolExecutor).
+    :returns: SyncResult with the number of copied, unchanged and removed files.
+    """
+
+    if link not in LINK_MODES:
+        raise ValueError(f'Unknown asset_link {link!r}, choose from {LINK_MODES}.')
+
+    src_files = list_files(path_src)
+    dst_files = list_files(path_dst) if path_dst.exists() else dict()
+
+    for folder in {path_dst / relative.parent for relative in src_files}:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        copied = list(pool.map(
+            lambda relative: sync_file(path_src / relative,
+                                       path_dst / relative,
+                                       src_files[relative],
+                                       dst_files.get(relative),
+                                       link),
+            src_files))
+
+    stale = [relative for relative in dst_files if relative not in src_files]
+    for relative in stale:
+        (path_dst / relative).unlink()
+    _remove_empty_folders(path_dst)
+
+    return SyncResult(sum(copied), len(copied) - sum(copied), len(stale))
+
+
+def sync_file(path_src, path_dst, src_stat, dst_stat, link='reflink'):
+    """
+    Copy a file if the destination is missing or differs from the source. Files with the same size and modification time are considered equal. Files with the same size but another modification time are compared by hash.
+
+    -----
+    :param path_src: Path to the source file.
+    :param path_dst: Path to the destination file.
+    :param src_stat: (size, mtime_ns) of the source file.
+    :param dst_stat: (size, mtime_ns) of the destination file or None if it does not exist.
+    :param link: How the file is copied (one of LINK_MODES).
+    :returns: True if the file was copied, else False.
+    """
+
+    if dst_stat is not None and dst_stat[0] == src_stat[0]:
+        if dst_stat[1] == src_stat[1]:
+            return False
+        if hash_file(path_src) == hash_file(path_dst):
+            os.utime(path_dst, ns=(src_stat[1], src_stat[1]))
+            return False
+
+    path_tmp = path_dst.with_name(f'.{path_dst.name}.tmp')
+    if path_tmp.exists():
+        path_tmp.unlink()
+    try:
+        if not (link == 'hardlink' and _hardlink(path_src, path_tmp)):
+            if not (link != 'copy' and _reflink(path_src, path_tmp)):
+                shutil.copy2(path_src, path_tmp)
+        os.replace(path_tmp, path_dst)
+    finally:
+        if path_tmp.exists():
+            path_tmp.unlink()
+    return True
+
+
+def list_files(path):
+    """
+    Return the size and modification time of all files in a folder (recursively), indexed by their path relative to the folder.
+
+    -----
+    :param path: Path to the folder.
+    :returns: Dictionary of relative paths and (size, mtime_ns).
+    """
+
+    files = dict()
+    stack = [path]
+    while stack:
+        folder = stack.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(folder / entry.name)
+                else:
+                    stat = entry.stat()
+                    relative = (folder / entry.name).relative_to(path)
+                    files[relative] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def hash_file(path):
+    """
+    Return the sha1 hex digest of the contents of a file. The file is read in chunks, so large files are not loaded into memory.
+
+    -----
+    :param path: Path to the file.
+    :returns: Hex digest as string.
+    """
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hardlink(path_src, path_dst):
+    try:
+        os.link(path_src, path_dst)
+    except OSError:
+        return False
+    return True
+
+
+def _reflink(path_src, path_dst):
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(path_src, 'rb') as src, open(path_dst, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+                               errno.ENOTTY, errno.EBADF, errno.ENOSYS):
+                raise
+            cloned = False
+        else:
+            cloned = True
+    if cloned:
+        shutil.copystat(path_src, path_dst)
+    else:
+        os.unlink(path_dst)
+    return cloned
+
+
+def _remove_empty_folders(path):
+    for root, dirs, _ in os.walk(path, topdown=False):
+        for name in dirs:
+            folder = os.path.join(root, name)
+            if not os.listdir(folder):
+                os.rmdir(folder)
@@ -0,0 +1,524 @@
+"""
+The build module
+================
+This module takes care of rendering the md files in the content folder and writing them to the output folder. The pages can either be rendered one after another or be fanned out over a pool of worker processes. It also contains the other stages of the build: writing the sitemap, writing the search index, synchronizing the assets, writing the stylesheets used by the pages to the output folder and keeping the cache of rendered sections within its maximum size.
+
+Importing the modules of the site builder has no side effects. Everything that reads or writes files (`config.ini`, `properties.ini`, the templates and stylesheets) is set up by the build context with `init_build`, before the pages are rendered.
+
+Every worker process is initialized once with the state it needs for rendering pages:
+- The SiteStructure.
+- The SiteProperties.
+- The base templates and snippets (compiled templates are shared through the bytecode cache in the cache folder).
+- The function mapping, available stylesheets, StylesheetPipeline, output format, search setting and Timestamps of the PageBuilder.
+- The location and maximum size of the cache of rendered sections (every process opens its own SectionCache, see the section_cache module).
+- The BuildManifest (if building incrementally).
+- The records of the files in the output folder (see the outputs module).
+- Whether the build is being profiled (see the profiling module).
+
+After this only the paths of the md files are sent to the workers (in small batches, with a cap on the number of pages in flight), and only a small PageResult is sent back for every page. The pages (and their terms for the search index and the rendered sections) are written by the process that renders them, so a rendered page never travels between processes and is released as soon as it is written. Every process writes its files with a writer thread (see the outputs module), so the next page is rendered while the previous ones are written. A PageResult is only passed on once its page is written. When the pages are rendered in the current process, the jinja2 environments are kept as they are, so their compiled templates can be reused between builds (see the watch module).
+
+    Objects in this module
+    ----------------------
+    - PageResult (class)
+    - init_build (function)
+    - find_pages (function)
+    - iter_pages (function)
+    - build_pages (function)
+    - render_files (function)
+    - render_file (function)
+    - init_worker (function)
+    - get_worker_state (function)
+    - write_sitemap (function)
+    - write_search_index (function)
+    - copy_assets (function)
+    - copy_stylesheets (function)
+    - evict_section_cache (function)
+"""
+
+import os
+import shutil
+import itertools
+from pathlib import Path
+from collections import namedtuple, deque
+from concurrent.futures import Future
+from site_builder import config
+from site_builder import site_specs
+from site_builder import page_loader
+from site_builder import page_builder
+from site_builder import section_processing
+from site_builder import manifest
+from site_builder import assets
+from site_builder import outputs
+from site_builder import stylesheets
+from site_builder import search
+from site_builder import section_cache
+from site_builder import timestamps
+from site_builder import profiling
+
+
+PageResult = namedtuple('PageResult', ['page_id',
+                                       'href',
+                                       'stylesheets',
+                                       'unresolved',
+                                       'inputs',
+                                       'rendered',
+                                       'dependencies',
+                                       'profile',
+                                       'output',
+                                       'written'])
+
+PROPERTY_ATTRIBUTES = [
+    'name',
+    'version',
+    'language',
+    'tbd',
+    '_footer_info',
+    '_footer_contact',
+    'footer_info',
+    'footer_contact',
+    ]
+
+SITEMAP = 'sitemap.html'
+BATCH_SIZE = 4  # Number of pages sent to a worker process at once
+MAX_IN_FLIGHT_PER_JOB = 8
+
+_worker = dict()
+
+
+def init_build(output_format=None, no_increment=True, stylesheet_mode=None,
+               search_index=None, reproducible=None):
+    """
+    Set up the build context: load the site properties, the base templates, the snippets and the (available) stylesheets. The paths are taken from `config.ini`, which is loaded first if this has not been done yet (see `config.load_config`).
+
+    -----
+    :param output_format: Format of the html output (defaults to the output format in `config.ini`).
+    :param stylesheet_mode: How stylesheets are written (defaults to the stylesheet mode in `config.ini`, see the stylesheets module).
+    :param no_increment: If False, the build version of the site properties is incremented.
+    :param search_index: Whether the search index is built (defaults to `search` in `config.ini`, see the search module).
+    :param reproducible: Whether the dates are taken from a fixed source (defaults to `reproducible` in `config.ini` or whether SOURCE_DATE_EPOCH is set, see the timestamps module).
+    :returns: None
+    """
+
+    site_specs.SiteProperties.load_properties(no_increment=no_increment)
+
+    PageBuilder = page_builder.PageBuilder
+    PageBuilder.PageEnv = page_builder.load_templates()
+    PageBuilder.available_stylesheets = page_builder.find_stylesheets()
+    PageBuilder.stylesheet_pipeline = stylesheets.StylesheetPipeline(
+        config.PATH_CONFIG['templates'],
+        stylesheet_mode or config.BUILD_CONFIG['stylesheets'])
+    PageBuilder.output_format = output_format or config.BUILD_CONFIG['output_format']
+    if search_index is None:
+        search_index = _is_enabled('search')
+    PageBuilder.search = search_index
+    if reproducible is None:
+        reproducible = (_is_enabled('reproducible')
+                        or timestamps.source_date_epoch() is not None)
+    PageBuilder.timestamps = timestamps.Timestamps(reproducible, config.PATH_CONFIG['content'])
+    section_processing.SNIPPETS_ENV = section_processing._load_snippets()
+
+
+def get_worker_state(structure, path_output, build_manifest=None,
+                     output_hashes=None):
+    """
+    Collect the state needed for rendering pages in a worker process.
+
+    -----
+    :param structure: SiteStructure of the site.
+    :param path_output: Path to the output folder.
+    :param build_manifest: BuildManifest if building incrementally, else None.
+    :param output_hashes: OutputHashes of the output folder, else None.
+    :returns: Worker state as dictionary.
+    """
+
+    PageBuilder = page_builder.PageBuilder
+    state = dict(
+        structure=structure,
+        path_output=path_output,
+        manifest=build_manifest,
+        output_hashes=output_hashes.files if output_hashes is not None else dict(),
+        properties={attr: getattr(site_specs.SiteProperties, attr)
+                    for attr in PROPERTY_ATTRIBUTES},
+        templates=PageBuilder.PageEnv.loader.mapping,
+        snippets=section_processing.SNIPPETS_ENV.loader.mapping,
+        function_mapping=PageBuilder.function_mapping,
+        available_stylesheets=PageBuilder.available_stylesheets,
+        stylesheet_pipeline=PageBuilder.stylesheet_pipeline,
+        output_format=PageBuilder.output_format,
+        search=PageBuilder.search,
+        timestamps=PageBuilder.timestamps,
+        section_cache=_section_cache_size(),
+        path_cache=config.PATH_CONFIG['cache'],
+        profile=profiling.is_enabled(),
+        )
+    if build_manifest is not None:
+        pipeline = PageBuilder.stylesheet_pipeline
+        settings = dict(output_format=PageBuilder.output_format,
+                        stylesheets=pipeline.mode,
+                        search=PageBuilder.search)
+        if pipeline.mode != 'plain':
+            # The names of the stylesheets depend on their contents
+            settings['stylesheet_hashes'] = pipeline.hashes
+        state['shared_inputs'] = manifest.shared_inputs(settings)
+        state['template_hashes'] = manifest.template_hashes(
+            config.PATH_CONFIG['templates'])
+        state['page_templates'] = manifest.referenced_templates(
+            PageBuilder.PageEnv, 'base')
+    return state
+
+
+def init_worker(state):
+    """
+    Initialize the (worker) process with the state collected by `get_worker_state`.
+
+    -----
+    :param state: Worker state as dictionary.
+    :returns: None
+    """
+
+    for attr, value in state['properties'].items():
+        setattr(site_specs.SiteProperties, attr, value)
+
+    PageBuilder = page_builder.PageBuilder
+    PageBuilder.structure = state['structure']
+    if PageBuilder.PageEnv is None or PageBuilder.PageEnv.loader.mapping is not state['templates']:
+        PageBuilder.PageEnv = page_builder.load_templates(state['templates'])
+    PageBuilder.function_mapping = state['function_mapping']
+    PageBuilder.available_stylesheets = state['available_stylesheets']
+    PageBuilder.stylesheet_pipeline = state['stylesheet_pipeline']
+    PageBuilder.output_format = state['output_format']
+    PageBuilder.search = state['search']
+    PageBuilder.timestamps = state['timestamps']
+    snippets_env = section_processing.SNIPPETS_ENV
+    if snippets_env is None or snippets_env.loader.mapping is not state['snippets']:
+        section_processing.SNIPPETS_ENV = section_processing._load_snippets(state['snippets'])
+    if 'writer' in _worker:
+        _worker['writer'].close()
+    writer = outputs.WriteBehind()
+    PageBuilder.section_cache = None
+    if state['section_cache']:
+        PageBuilder.section_cache = section_cache.SectionCache(state['path_cache'],
+                                                               state['section_cache'],
+                                                               state['snippets'],
+                                                               writer)
+    if state['profile']:
+        profiling.enable()
+
+    _worker.clear()
+    _worker.update(state)
+    _worker['page_ids'] = set(state['structure'].page_ids)
+    _worker['writer'] = writer
+
+
+def render_file(file_path_md):
+    """
+    Read an md file, render it and hand the page (and its terms for the search index) to the writer of the process. If building incrementally, the page is skipped if the manifest shows that its inputs have not changed.
+
+    The output of the PageResult of a rendered page is a Future with the result of writing the page, until it is resolved (see `render_files`).
+
+    -----
+    :param file_path_md: Path to the markdown file.
+    :returns: PageResult or None if the md file has no valid page id.
+    """
+
+    structure = _worker['structure']
+    build_manifest = _worker['manifest']
+    position = profiling.mark()
+
+    with profiling.measure('read_md') as record:
+        content = page_loader.read_md(file_path_md, _worker['page_ids'],
+                                      _worker['timestamps'])
+    if content is None:
+        profiling.take(position)
+        return None
+    record['page'] = content.page_id
+
+    href = structure[content.page_id]['Href']
+    full_path = _worker['path_output'] / href
+    previous = _worker['output_hashes'].get(href)
+
+    inputs = None
+    if build_manifest is not None:
+        inputs = manifest.page_inputs(content,
+                                      structure,
+                                      _worker['shared_inputs'])
+        current = build_manifest.is_current(href,
+                                            inputs,
+                                            _worker['template_hashes'])
+        if (current and full_path.exists()
+                and (not _worker['search'] or search.has_page_terms(_worker['path_output'], href))):
+            return PageResult(content.page_id, href,
+                              build_manifest.stylesheets(href), [], inputs,
+                              False, None, profiling.take(position),
+                              previous, False)
+
+    page = page_builder.PageBuilder(content)
+    output_html = page.build_page()
+    page_id = content.page_id
+    stylesheets, unresolved, snippets = page.stylesheets, page.unresolved, page.snippets
+    if page.terms is not None:
+        search.write_page_terms(_worker['path_output'], href, page.terms,
+                                _worker['writer'])
+    del page, content  # Release the sections and intermediate strings before writing
+
+    dependencies = None
+    if build_manifest is not None:
+        dependencies = manifest.page_dependencies(_worker['page_templates'],
+                                                  snippets,
+                                                  _worker['template_hashes'])
+
+    with profiling.measure('enqueue', page_id):
+        output = _worker['writer'].submit(full_path, output_html, previous)
+    del output_html
+
+    return PageResult(page_id,
+                      href,
+                      stylesheets,
+                      unresolved,
+                      inputs,
+                      True,
+                      dependencies,
+                      profiling.take(position),
+                      output,
+                      None)
+
+
+def find_pages(path_content):
+    """
+    Yield the paths of the md files in the content folder. The folders are walked one at a time in sorted order, so the files are found lazily and always in the same order.
+
+    -----
+    :param path_content: Path to the content folder.
+    :returns: Generator of paths.
+    """
+
+    for root, dirs, files in os.walk(path_content):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.md'):
+                yield Path(root) / name
+
+
+def iter_pages(files, structure, path_output, jobs=1, build_manifest=None,
+               output_hashes=None, max_in_flight=None):
+    """
+    Render the md files, write them to the output folder and yield a PageResult for every page as soon as it is done. If jobs is larger than one, the files are rendered by a pool of worker processes. Pages whose output did not change are not written again (see the outputs module).
+
+    The files are taken from the iterable one batch at a time and at most max_in_flight pages are handed to the pool at any moment, so the memory used does not grow with the number of pages. The PageResults are yielded in the order in which the pages are done.
+
+    The profiling records of the pages are added to the profiler, the records of the written files are added to the output hashes and, if building incrementally, the manifest is updated.
+
+    -----
+    :param files: Paths to the markdown files (e.g. from `find_pages`).
+    :param structure: SiteStructure of the site.
+    :param path_output: Path to the output folder.
+    :param jobs: Number of worker processes.
+    :param build_manifest: BuildManifest if building incrementally, else None.
+    :param output_hashes: OutputHashes of the output folder, else None.
+    :param max_in_flight: Maximum number of pages handed to the pool at the same time (defaults to MAX_IN_FLIGHT_PER_JOB per job).
+    :returns: Generator of PageResults.
+    """
+
+    state = get_worker_state(structure, path_output, build_manifest,
+                             output_hashes)
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        max_in_flight = max_in_flight or jobs * MAX_IN_FLIGHT_PER_JOB
+        max_batches = max(1, max_in_flight // BATCH_SIZE)
+        files = iter(files)
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=init_worker,
+                                 initargs=(state,)) as pool:
+            pending = set()
+            while True:
+                batch = list(itertools.islice(files, BATCH_SIZE))
+                if batch:
+                    pending.add(pool.submit(render_files, batch))
+                if not pending:
+                    break
+                if batch and len(pending) < max_batches:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        yield _record_result(result, build_manifest, output_hashes)
+    else:
+        init_worker(state)
+        writer = _worker['writer']
+        pending = deque()
+        for file in files:
+            result = render_file(file)
+            if result is not None:
+                pending.append(result)
+            while pending and _is_written(pending[0]):
+                yield _record_result(_resolve(pending.popleft()),
+                                     build_manifest, output_hashes)
+        writer.flush()
+        while pending:
+            yield _record_result(_resolve(pending.popleft()),
+                                 build_manifest, output_hashes)
+
+
+def build_pages(files, structure, path_output, jobs=1, build_manifest=None,
+                output_hashes=None):
+    """
+    Render the md files and write them to the output folder (see `iter_pages`).
+
+    -----
+    :param files: Paths to the markdown files.
+    :param structure: SiteStructure of the site.
+    :param path_output: Path to the output folder.
+    :param jobs: Number of worker processes.
+    :param build_manifest: BuildManifest if building incrementally, else None.
+    :param output_hashes: OutputHashes of the output folder, else None.
+    :returns: List of PageResults.
+    """
+
+    return list(iter_pages(files, structure, path_output, jobs,
+                           build_manifest, output_hashes))
+
+
+def render_files(files):
+    """
+    Render a batch of md files in a worker process (see `render_file`) and wait until the pages are written.
+
+    -----
+    :param files: Paths to the markdown files.
+    :returns: List of PageResults of the files with a valid page id.
+    """
+
+    results = [render_file(file) for file in files]
+    _worker['writer'].flush()
+    return [_resolve(result) for result in results if result is not None]
+
+
+def _is_written(result):
+    return not isinstance(result.output, Future) or result.output.done()
+
+
+def _resolve(result):
+    if not isinstance(result.output, Future):
+        return result
+    record, written, seconds = result.output.result()
+    profile = result.profile
+    if profiling.is_enabled():
+        profile = profile + [profiling.timed('write', seconds, result.page_id)]
+    return result._replace(output=record, written=written, profile=profile)
+
+
+def _record_result(result, build_manifest, output_hashes):
+    profiling.extend(result.profile)
+    if output_hashes is not None and result.output is not None:
+        output_hashes.update(result.href, result.output)
+    if build_manifest is not None and result.rendered:
+        build_manifest.update(result.href,
+                              result.page_id,
+                              result.inputs,
+                              result.dependencies,
+                              result.stylesheets)
+    return result._replace(profile=None)
+
+
+def write_sitemap(path_output, output_hashes=None):
+    """
+    Render the sitemap and write it to the output folder (if it changed).
+
+    -----
+    :param path_output: Path to the output folder.
+    :param output_hashes: OutputHashes of the output folder, else None.
+    :returns: True if the sitemap was written.
+    """
+
+    output_html = page_builder.PageBuilder.build_sitemap()
+    record = output_hashes.get(SITEMAP) if output_hashes is not None else None
+    record, written = outputs.write_text(path_output / SITEMAP, output_html, record)
+    if output_hashes is not None:
+        output_hashes.update(SITEMAP, record)
+    return written
+
+
+def write_search_index(path_output, pages, rendered=()):
+    """
+    Write the shards of the search index of the sections that changed to the output folder (see the search module). If the search index is disabled, it is removed from the output folder.
+
+    -----
+    :param path_output: Path to the output folder.
+    :param pages: Href and page id of every page in the build as iterable of tuples.
+    :param rendered: Hrefs of the pages that were rendered in this build.
+    :returns: Names of the written shards as list.
+    """
+
+    PageBuilder = page_builder.PageBuilder
+    search_index = search.SearchIndex(path_output)
+    if not PageBuilder.search:
+        search_index.remove()
+        return []
+    return search_index.write(PageBuilder.structure,
+                              pages,
+                              rendered,
+                              config.PATH_CONFIG['templates'] / search.SCRIPT)
+
+
+def copy_assets(path_content, path_output, link=None, threads=None):
+    """
+    Synchronize the iframes and images folders of the output folder with the content folder. Only new and changed files are copied and files that were removed from the content folder are removed from the output folder (see the assets module).
+
+    -----
+    :param path_content: Path to the content folder.
+    :param path_output: Path to the output folder.
+    :param link: How files are copied (defaults to `asset_link` in `config.ini`).
+    :param threads: Number of threads used for copying.
+    :returns: SyncResult with the total number of copied, unchanged and removed files.
+    """
+
+    link = link or config.BUILD_CONFIG['asset_link']
+    results = [assets.SyncResult(0, 0, 0)]
+    for folder in ['iframes', 'images']:
+        path_src = path_content / folder
+        path_dst = path_output / folder
+        if path_src.exists():
+            results.append(assets.sync_folder(path_src, path_dst, link, threads))
+        elif path_dst.exists():
+            removed = len(assets.list_files(path_dst))
+            shutil.rmtree(path_dst)
+            results.append(assets.SyncResult(0, 0, removed))
+    return assets.SyncResult(*map(sum, zip(*results)))
+
+
+def copy_stylesheets(path_output, stylesheet_sets):
+    """
+    Write the stylesheets used by the pages to the css folder in the output folder with the StylesheetPipeline of the PageBuilder (see the stylesheets module). The stylesheets of the sitemap are always included.
+
+    -----
+    :param path_output: Path to the output folder.
+    :param stylesheet_sets: Stylesheets used per page as iterable of lists.
+    :returns: Names of the written stylesheets as list.
+    """
+
+    PageBuilder = page_builder.PageBuilder
+    stylesheet_sets = list(stylesheet_sets) + [PageBuilder.sitemap_stylesheets
+                                               + PageBuilder.feature_stylesheets()]
+    return PageBuilder.stylesheet_pipeline.write(path_output, stylesheet_sets)
+
+
+def evict_section_cache():
+    """
+    Remove the least recently used sections from the cache of rendered sections until it is within the maximum size set with `section_cache` in `config.ini` (see the section_cache module).
+
+    -----
+    :returns: Number of removed sections.
+    """
+
+    max_size = _section_cache_size()
+    if not max_size:
+        return 0
+    cache = section_cache.SectionCache(config.PATH_CONFIG['cache'], max_size)
+    return cache.evict()
+
+
+def _is_enabled(setting):
+    return config.BUILD_CONFIG[setting].lower() in ('yes', 'true', 'on', '1')
+
+
+def _section_cache_size():
+    return int(float(config.BUILD_CONFIG['section_cache']) * 1024 * 1024)
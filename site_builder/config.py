@@ -5,50 +5,113 @@ This site_builder needs access to the following folders:
 - The content folder
 - The templates folder
 - The output folder
+- The cache folder (for the compiled templates and rendered sections, defaults to `.cache` in the main folder)
 
 These folder locations can be customized by changing their value in the `config.ini` file. However by default the site_builder expects these folders to reside in the main folder.
 
-This module loads the stored paths from `config.ini` in order to make them accessible to the other modules and scripts. Upon initialization it will check if the content, templates and output paths exist. If not, it will set these paths to the default and create the folders if they do not yet exist.
+This module loads the stored paths from `config.ini` in order to make them accessible to the other modules and scripts. Importing the module has no side effects: the configuration is loaded with `load_config` (which is called by the build context, see `build.init_build`) or else on first access of PATH_CONFIG or BUILD_CONFIG. When loading, it will check if the content, templates and output paths exist. If not, it will set these paths to the default and create the folders if they do not yet exist.
 
 Note that if the template folder is missing completely, then the .html and .css template files will also be missing. Without access to these files the site builder will fail sooner, rather than later.
 
+The `config.ini` file also contains a BUILD section with the default settings for building the site. Missing settings are added with their default value:
+==============  ==============  ================================================
+Setting         Default         Description
+==============  ==============  ================================================
+output_format   pretty          Format of the html output (pretty/raw/minified)
+structure_file  structure.xlsx  Structure file in the content folder (xlsx/csv/json/toml)
+stylesheets     plain           How stylesheets are written to the output folder (plain/hashed/bundled, see the stylesheets module)
+asset_link      reflink         How assets are copied to the output folder (reflink/hardlink/copy, see the assets module)
+search          yes             Whether the search index and search widget are built (yes/no, see the search module)
+section_cache   64              Maximum size of the cache of rendered sections in MB (0 switches it off, see the section_cache module)
+reproducible    no              Whether the dates on the pages are taken from a fixed source, so the output can be reproduced (yes/no, see the timestamps module)
+==============  ==============  ================================================
+
     Objects in this module
     ----------------------
-    - path_config_check (function)
+    - load_config (function)
     - PATH_CONFIG (constant)
+    - BUILD_CONFIG (constant)
+    - BUILD_DEFAULTS (constant)
 """
 
 import configparser
+from io import StringIO
 from pathlib import Path
 
 
 workdir = Path(__file__).resolve().parent.parent
 
-config_file = './config.ini'
-config = configparser.ConfigParser()
-config.read(config_file)
-config_paths = config['PATHS']
-
-PATH_CONFIG = dict()  # Dictionary used by the other scripts and modules
-
-for key in config_paths:
-    if key == 'workdir':
-        continue
-    PATH_CONFIG[key] = Path(config_paths[key])
-
-for key in PATH_CONFIG:
-    if not PATH_CONFIG[key].exists():
-        print(f'Path to {key} not found: {PATH_CONFIG[key]}')
-        PATH_CONFIG[key] = workdir / key
-        print(f'Set {key} path to {PATH_CONFIG[key]}')
-        if not PATH_CONFIG[key].exists():
-            PATH_CONFIG[key].mkdir(parents=True)
-
-config['PATHS'] = {}
-config['PATHS']['workdir'] = str(workdir)
-config['PATHS']['templates'] = str(PATH_CONFIG['templates'])
-config['PATHS']['content'] = str(PATH_CONFIG['content'])
-config['PATHS']['output'] = str(PATH_CONFIG['output'])
-
-with open(config_file, 'w') as f:
-    config.write(f)
+BUILD_DEFAULTS = {
+    'output_format': 'pretty',
+    'structure_file': 'structure.xlsx',
+    'stylesheets': 'plain',
+    'asset_link': 'reflink',
+    'search': 'yes',
+    'section_cache': '64',
+    'reproducible': 'no',
+}
+
+
+def load_config(config_file='./config.ini'):
+    """
+    Load the paths and build settings from `config.ini` into PATH_CONFIG and BUILD_CONFIG. Missing folders are replaced with the default folders and missing settings with their default value. The config file is only rewritten if this changed its contents, so that worker processes loading the config do not truncate the file while others read it.
+
+    -----
+    :param config_file: Path to the config file.
+    :returns: None
+    """
+
+    global PATH_CONFIG, BUILD_CONFIG
+
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    config_paths = config['PATHS']
+
+    path_config = dict()
+    for key in config_paths:
+        if key == 'workdir':
+            continue
+        path_config[key] = Path(config_paths[key])
+
+    for key in path_config:
+        if key == 'cache':
+            continue
+        if not path_config[key].exists():
+            print(f'Path to {key} not found: {path_config[key]}')
+            path_config[key] = workdir / key
+            print(f'Set {key} path to {path_config[key]}')
+            if not path_config[key].exists():
+                path_config[key].mkdir(parents=True)
+
+    # The cache folder is optional and created when it is first used
+    path_config.setdefault('cache', workdir / '.cache')
+
+    config['PATHS'] = {}
+    config['PATHS']['workdir'] = str(workdir)
+    config['PATHS']['templates'] = str(path_config['templates'])
+    config['PATHS']['content'] = str(path_config['content'])
+    config['PATHS']['output'] = str(path_config['output'])
+    config['PATHS']['cache'] = str(path_config['cache'])
+
+    build_config = dict(BUILD_DEFAULTS)
+    if config.has_section('BUILD'):
+        build_config.update(config['BUILD'])
+    config['BUILD'] = build_config
+
+    config_text = StringIO()
+    config.write(config_text)
+    if not Path(config_file).exists() or Path(config_file).read_text() != config_text.getvalue():
+        with open(config_file, 'w') as f:
+            f.write(config_text.getvalue())
+
+    # Dictionaries used by the other scripts and modules
+    PATH_CONFIG = path_config
+    BUILD_CONFIG = build_config
+
+
+def __getattr__(name):
+    # Load the config on first access of PATH_CONFIG or BUILD_CONFIG
+    if name in ('PATH_CONFIG', 'BUILD_CONFIG'):
+        load_config()
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,171 @@
+"""
+The csv_sections module
+=======================
+This module contains a lightweight engine for the sections that are written as csv (table, card and flextable). It reads the csv with the csv module from the standard library and writes the html into a list buffer, so these sections can be rendered without pandas.
+
+The output is identical to the output of the original pandas based implementation (`pd.read_csv` with `skipinitialspace=True` and `quotechar="'"`, followed by `DataFrame.to_html` for tables). To achieve this the engine mimics the type inference of `pd.read_csv`: a column is converted to integers, floats or booleans if all its values can be converted, which affects how the values are printed (e.g. '01' becomes '1' and an integer column with empty cells becomes a float column: '1.0').
+
+Input that would be parsed ambiguously (duplicate or empty column names, rows that are longer than the header, tables without rows, integers that do not fit into int64, infinite values) raises UnsupportedCsv. The section processing functions then fall back to pandas.
+
+    Objects in this module
+    ----------------------
+    - CsvTable (class)
+    - UnsupportedCsv (class)
+    - read_csv (function)
+    - html_table (function)
+    - NA_VALUES (constant)
+"""
+
+import re
+import csv
+from io import StringIO
+from collections import namedtuple
+
+
+# Strings that pandas (1.x) reads as missing values
+NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan',
+    'null',
+    }
+TRUE_VALUES = {'True', 'TRUE', 'true'}
+FALSE_VALUES = {'False', 'FALSE', 'false'}
+
+_INT = re.compile(r'\s*[+-]?\d+\s*', re.ASCII)
+_FLOAT = re.compile(r'\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*', re.ASCII)
+_INF = re.compile(r'\s*[+-]?inf', re.IGNORECASE)
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+CsvTable = namedtuple('CsvTable', ['columns', 'rows'])
+CsvTable.__doc__ = """
+Table read from csv. The columns are a list of names, the rows a list of lists containing the cell values as strings (missing values are empty strings).
+"""
+
+
+class UnsupportedCsv(Exception):
+    """
+    Raised when the csv cannot be read in the same way as pandas would.
+    """
+
+
+def read_csv(text, header_row=0, header_names=None):
+    """
+    Read csv into a CsvTable. The values of every column are converted to strings the way pandas would print them.
+
+    -----
+    :param text: Table as csv.
+    :param header_row: 0 if the first row contains the column names, None if it does not.
+    :param header_names: Column names to use if there is no header row.
+    :returns: CsvTable.
+    """
+
+    lines = text.splitlines()
+    reader = csv.reader(StringIO(text), skipinitialspace=True, quotechar="'")
+    rows = list()
+    try:
+        for row in reader:
+            if not row:
+                continue
+            if row == ['']:
+                if lines[reader.line_num - 1].strip():
+                    raise UnsupportedCsv('Ambiguous empty row.')
+                continue
+            rows.append(row)
+    except csv.Error as e:
+        raise UnsupportedCsv(str(e)) from None
+
+    if header_row == 0:
+        if not rows:
+            raise UnsupportedCsv('No header.')
+        columns = rows.pop(0)
+        if '' in columns or len(set(columns)) < len(columns):
+            raise UnsupportedCsv('Empty or duplicate column names.')
+    else:
+        columns = list(header_names)
+
+    if not rows:
+        raise UnsupportedCsv('No rows.')
+    number_of_cols = len(columns)
+    if any(len(row) > number_of_cols for row in rows):
+        raise UnsupportedCsv('Row longer than header.')
+    if len(rows) == 1 and len(rows[0]) < number_of_cols:
+        raise UnsupportedCsv('Single row shorter than header.')
+
+    values = [[row[idx] if idx < len(row) else None for row in rows]
+              for idx in range(number_of_cols)]
+    values = [_convert_column(column) for column in values]
+    return CsvTable(columns, [list(row) for row in zip(*values)])
+
+
+def html_table(table, classes=None):
+    """
+    Render a CsvTable as html table (as `DataFrame.to_html` with `index=False` and `escape=False` would).
+
+    -----
+    :param table: CsvTable.
+    :param classes: Optional css class to be added to the table.
+    :returns: html-output as string.
+    """
+
+    css_class = 'dataframe' if classes is None else f'dataframe {classes}'
+    output = [f'<table border="1" class="{css_class}">\n',
+              '  <thead>\n',
+              '    <tr style="text-align: right;">\n']
+    for column in table.columns:
+        output.append(f'      <th>{column.strip()}</th>\n')
+    output.append('    </tr>\n'
+                  '  </thead>\n'
+                  '  <tbody>\n')
+    for row in table.rows:
+        output.append('    <tr>\n')
+        for item in row:
+            output.append(f'      <td>{_escape_cell(item)}</td>\n')
+        output.append('    </tr>\n')
+    output.append('  </tbody>\n'
+                  '</table>')
+    return ''.join(output)
+
+
+def _escape_cell(item):
+    return (item.replace('\t', '\\t')
+                .replace('\n', '\\n')
+                .replace('\r', '\\r')
+                .strip())
+
+
+def _convert_column(column):
+    """
+    Convert the values of a column to strings the way pandas would print them after inferring the type of the column.
+
+    -----
+    :param column: Values of the column as list of strings (None for missing cells).
+    :returns: Converted values as list of strings.
+    """
+
+    na = [value is None or value in NA_VALUES for value in column]
+    values = [value for value, is_na in zip(column, na) if not is_na]
+
+    for value in values:
+        if _INT.fullmatch(value) and not _INT64_MIN <= int(value) <= _INT64_MAX:
+            raise UnsupportedCsv('Integer out of range.')
+
+    if all(_INT.fullmatch(value) for value in values):
+        if any(na):
+            # integers are converted to float (so '-0' becomes '0.0')
+            return ['' if is_na else str(float(int(value))) for value, is_na in zip(column, na)]
+        return [str(int(value)) for value in column]
+    elif all(_FLOAT.fullmatch(value) for value in values):
+        return ['' if is_na else _float(value) for value, is_na in zip(column, na)]
+    elif any(_INF.match(value) for value in values):
+        raise UnsupportedCsv('Infinite values.')
+    elif all(value in TRUE_VALUES or value in FALSE_VALUES for value in values):
+        return ['' if is_na else str(value in TRUE_VALUES) for value, is_na in zip(column, na)]
+    return ['' if is_na else value for value, is_na in zip(column, na)]
+
+
+def _float(value):
+    number = float(value)
+    if number in (float('inf'), float('-inf')):
+        raise UnsupportedCsv('Float out of range.')
+    return str(number)
@@ -0,0 +1,129 @@
+"""
+The fragments module
+====================
+This module contains the FragmentCache class, which renders the parts of the page that are shared between pages once. Its functions are added to the jinja2 environment of the base templates by `page_builder.load_templates`. It lives in a module of its own, so the page_builder module can be imported without importing jinja2.
+
+    Objects in this module
+    ----------------------
+    - FragmentCache (class)
+"""
+
+import re
+import jinja2
+import jinja2.meta
+
+
+class FragmentCache:
+    """
+    The FragmentCache class renders the parts of the page that are shared between pages (such as the navigation, the aside and the footer) once and reuses the output. It is added to the jinja2 environment of the base templates as the following global functions:
+
+    ==============================  ==================================================
+    Function                        Description
+    ==============================  ==================================================
+    fragment(name)                  Render the template with the given name with the variables of the current context.
+    highlight(value, name, output)  Return output if value equals the context variable with the given name, else an empty string.
+    ==============================  ==================================================
+
+    A fragment is cached on the values of the variables it uses (found with `jinja2.meta.find_undeclared_variables`), so the aside is rendered once per section and nest, the footer once per nest. Strings and numbers are part of the key by value, other objects (such as the sitemap of a section) by identity: these are shared between the pages through the navigation index of the SiteStructure, so looking up a fragment does not require comparing them. The cache holds on to the objects in its keys, so their identity is not reused by other objects. The cache is therefore cleared (see `clear`) when these objects are replaced, such as when the SiteStructure is reloaded in watch mode. Page specific highlights are written with `highlight`, which does not make the fragment depend on the compared variable. When rendering a fragment, highlight returns a placeholder instead. The cached fragment is stored split on its placeholders, so splicing in the highlights of a page only requires a lookup and a join.
+    """
+
+    placeholder_pattern = re.compile('\x00([^\x1f]*)\x1f([^\x1f]*)\x1f([^\x1f]*)\x1f([^\x00]*)\x00')
+
+    def __init__(self, env):
+        self.env = env
+        self.fragments = dict()
+        self.variables = dict()
+
+    def clear(self):
+        """
+        Remove all rendered fragments, together with the objects they were rendered from.
+
+        -----
+        :returns: None
+        """
+
+        self.fragments.clear()
+
+    @jinja2.pass_context
+    def fragment(self, context, name):
+        """
+        Return the rendered fragment with the highlights of the current context.
+
+        -----
+        :param context: jinja2 context of the template that calls the function.
+        :param name: Name of the fragment template.
+        :returns: Rendered fragment as string.
+        """
+
+        variables = self.variables.get(name)
+        if variables is None:
+            source = self.env.loader.get_source(self.env, name)[0]
+            variables = jinja2.meta.find_undeclared_variables(self.env.parse(source))
+            variables = self.variables[name] = sorted(variables - set(self.env.globals))
+
+        values = {variable: context.get(variable) for variable in variables}
+        key = (name, *(self._key(value) for value in values.values()))
+        cached = self.fragments.get(key)
+        if cached is None:
+            template = self.env.get_template(name)
+            output = template.render(values, _fragment=True)
+            cached = self.fragments[key] = (self._split(output), values)
+
+        texts, placeholders = cached[0]
+        if not placeholders:
+            return texts[0]
+        texts = list(texts)
+        for (name, replace_spaces), values in placeholders.items():
+            value = self._compared(context.get(name), replace_spaces)
+            for idx, output in values.get(value, []):
+                texts[idx] += output
+        return ''.join(texts)
+
+    @staticmethod
+    def _key(value):
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        return id(value)
+
+    @staticmethod
+    def _compared(value, replace_spaces):
+        value = str(value)
+        return value.replace(' ', '_') if replace_spaces else value
+
+    @staticmethod
+    def _split(output):
+        """
+        Split a rendered fragment on its placeholders.
+
+        -----
+        :param output: Rendered fragment as string.
+        :returns: The texts between the placeholders as list and the placeholders as dictionary (context variable name and replace_spaces > value > list of text index and output).
+        """
+
+        parts = FragmentCache.placeholder_pattern.split(output)
+        texts = parts[::5]
+        placeholders = dict()
+        for idx in range(1, len(parts), 5):
+            name, replace_spaces, value, output = parts[idx:idx + 4]
+            placeholders.setdefault((name, bool(replace_spaces)), dict()).setdefault(value, list()).append((idx // 5, output))
+        return texts, placeholders
+
+    @staticmethod
+    @jinja2.pass_context
+    def highlight(context, value, name, output, replace_spaces=False):
+        """
+        Return output if the value equals the context variable with the given name. Within a fragment, return a placeholder that is replaced when the fragment is spliced into the page.
+
+        -----
+        :param context: jinja2 context of the template that calls the function.
+        :param value: Value to compare.
+        :param name: Name of the context variable to compare the value with.
+        :param output: Output if the value is equal to the context variable.
+        :param replace_spaces: Whether spaces are replaced with underscores before comparing (so 'A page' equals 'A_page').
+        :returns: Output, empty string or placeholder.
+        """
+
+        value = FragmentCache._compared(value, replace_spaces)
+        if context.get('_fragment'):
+            return f'\x00{name}\x1f{"1" if replace_spaces else ""}\x1f{value}\x1f{output}\x00'
+        return output if value == FragmentCache._compared(context.get(name), replace_spaces) else ''
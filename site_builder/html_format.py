@@ -0,0 +1,128 @@
+"""
+The html_format module
+======================
+This module contains the functions for finalizing the html output of the site builder. The output format is set with `output_format` in the BUILD section of `config.ini` (or with the 'output_format' flag of the build site script):
+
+==========  ===========================================================
+Format      Description
+==========  ===========================================================
+pretty      Reindent the page with the prettify function of BeautifulSoup.
+raw         Leave the output of jinja2 as is.
+minified    Strip comments and collapse whitespace.
+==========  ===========================================================
+
+The minifier does not build a DOM. It tokenizes the html with a regular expression and works on a stream of chunks, so it can also be used on the output of `jinja2.Template.generate`. The contents of pre, textarea, script and style elements are left untouched, as are conditional comments.
+
+    Objects in this module
+    ----------------------
+    - format_html (function)
+    - prettify (function)
+    - minify (function)
+    - OUTPUT_FORMATS (constant)
+"""
+
+import re
+
+
+OUTPUT_FORMATS = ['pretty', 'raw', 'minified']
+
+_TOKEN = re.compile(r'<!--.*?-->'
+                    r'|<(pre|textarea|script|style)\b[^>]*>.*?</\1\s*>'
+                    r'|<[^>]*>'
+                    r'|[^<]+'
+                    r'|<',
+                    re.DOTALL | re.IGNORECASE)
+_RAW_OPEN = re.compile(r'<(pre|textarea|script|style)\b', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def format_html(html, output_format='pretty'):
+    """
+    Return the html in the given output format.
+
+    -----
+    :param html: Html as string.
+    :param output_format: One of OUTPUT_FORMATS.
+    :returns: Formatted html as string.
+    """
+
+    if output_format == 'pretty':
+        return prettify(html)
+    elif output_format == 'minified':
+        return ''.join(minify([html]))
+    elif output_format == 'raw':
+        return html
+    raise ValueError(f'Unknown output format: {output_format}')
+
+
+def prettify(html):
+    """
+    Return the html prettified by BeautifulSoup.
+
+    -----
+    :param html: Html as string.
+    :returns: Prettified html as string.
+    """
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, 'lxml').prettify()
+
+
+def minify(chunks):
+    """
+    Minify a stream of html chunks:
+    - Comments are removed (except for conditional comments).
+    - Whitespace is collapsed into a single newline (if it contained a newline) or a single space.
+    - The contents of pre, textarea, script and style elements and all tags are passed through unaltered.
+
+    Chunks may split the html at any position. Incomplete tokens at the end of a chunk are held back until the next chunk arrives.
+
+    -----
+    :param chunks: Iterable of html strings.
+    :returns: Generator of minified html strings.
+    """
+
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        output, buffer = _minify_buffer(buffer, final=False)
+        if output:
+            yield output
+    output, _ = _minify_buffer(buffer, final=True)
+    if output:
+        yield output
+
+
+def _minify_buffer(buffer, final):
+    """
+    Minify the complete tokens in the buffer.
+
+    -----
+    :param buffer: Html as string.
+    :param final: If False the last token and everything from an incomplete comment, element or unmatched '<' onwards is held back.
+    :returns: Minified html and the remainder of the buffer as tuple.
+    """
+
+    output = list()
+    position = len(buffer)
+    for match in _TOKEN.finditer(buffer):
+        token = match.group(0)
+        incomplete = (token == '<'
+                      or match.end() == len(buffer)
+                      or (token.startswith('<!--') and not token.endswith('-->'))
+                      or (match.group(1) is None and _RAW_OPEN.match(token)))
+        if incomplete and not final:
+            position = match.start()
+            break
+        if token.startswith('<!--'):
+            if token.startswith('<!--[if'):
+                output.append(token)
+        elif token.startswith('<'):
+            output.append(token)
+        else:
+            output.append(_WHITESPACE.sub(_collapse, token))
+    return ''.join(output), buffer[position:]
+
+
+def _collapse(match):
+    return '\n' if '\n' in match.group(0) else ' '
@@ -0,0 +1,361 @@
+"""
+The manifest module
+===================
+This module contains the BuildManifest class which makes incremental builds possible. The manifest records for every output page the hashes of the inputs that were used to render it:
+
+    - markdown: the md file and the dates that are printed on the page
+    - structure: the navigational data of the page in the SiteStructure
+    - properties: the site properties
+    - settings: the build settings that affect the output (such as the output format and the stylesheet mode)
+
+Next to these inputs, the manifest records the templates every page depends on, together with their hashes:
+
+    - the base template and the partials it includes (such as 'base_navigation', 'base_aside', 'base_header' and 'base_footer')
+    - the snippets used by the sections of the page (such as 'snippet_card' for pages with card sections)
+
+When the site is built incrementally, a page is only rendered again if any of these hashes differ from the ones stored in the manifest (or if the output file has gone missing). Because the dependencies are recorded per page, a change to `snippet_card.html` only affects the pages that contain card sections. The manifest also records the stylesheets every page uses, so the stylesheets of pages that are skipped are still written (see the stylesheets module). The manifest is stored in the output folder, so removing the output folder will always result in a full build.
+
+The dependency graph stored in the manifest can be queried with `print_dependencies` (or with the 'dependencies' flag of the build site script).
+
+    Objects in this module
+    ----------------------
+    - BuildManifest (class)
+    - hash_text (function)
+    - hash_files (function)
+    - page_inputs (function)
+    - shared_inputs (function)
+    - structure_inputs (function)
+    - template_hashes (function)
+    - referenced_templates (function)
+    - page_dependencies (function)
+    - print_dependencies (function)
+"""
+
+import json
+import hashlib
+from site_builder import site_specs
+
+
+MANIFEST_VERSION = 3
+
+
+class BuildManifest:
+    """
+    The BuildManifest class stores the input hashes and template dependencies of every page of the last build, indexed by the href of the page. The manifest is read from and saved to a json file.
+
+    A BuildManifest object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    is_current       Check if the stored inputs of a page are current.
+    update           Store the inputs of a (re)rendered page.
+    stylesheets      Return the stylesheets used by a page.
+    retain           Drop all pages that are not in the given hrefs.
+    save             Write the manifest to its json file.
+    dependencies     Return the templates a page depends on.
+    dependents       Return the pages that depend on a template.
+    ===============  =================================================
+    """
+
+    def __init__(self, path_manifest):
+        self.path = path_manifest
+        self.pages = dict()
+        if self.path.exists():
+            try:
+                manifest = json.loads(self.path.read_text(encoding='utf-8'))
+            except ValueError:
+                manifest = dict()
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.pages = manifest['pages']
+
+    def __len__(self):
+        return len(self.pages)
+
+    def is_current(self, href, inputs, templates):
+        """
+        Check if the page with the given href was built from the given inputs and if the templates it depends on are unchanged.
+
+        -----
+        :param href: Href of the page.
+        :param inputs: Input hashes of the page as dictionary.
+        :param templates: Current hashes of all templates as dictionary (see `template_hashes`).
+        :returns: True if the stored inputs are equal to the given inputs and the stored template hashes are current.
+        """
+
+        entry = self.pages.get(href)
+        if entry is None:
+            return False
+        if entry['inputs'] != inputs:
+            return False
+        return all(templates.get(name) == digest
+                   for name, digest in entry['dependencies'].items())
+
+    def update(self, href, page_id, inputs, dependencies, stylesheets=()):
+        """
+        Store the inputs, template dependencies and stylesheets of a page.
+
+        -----
+        :param href: Href of the page.
+        :param page_id: Id of the page.
+        :param inputs: Input hashes of the page as dictionary.
+        :param dependencies: Hashes of the templates the page depends on as dictionary.
+        :param stylesheets: Names of the stylesheets used by the page.
+        :returns: None
+        """
+
+        self.pages[href] = dict(page_id=page_id,
+                                inputs=inputs,
+                                dependencies=dependencies,
+                                stylesheets=list(stylesheets))
+
+    def retain(self, hrefs):
+        """
+        Remove the pages that are not part of the current build from the manifest.
+
+        -----
+        :param hrefs: Hrefs of the pages in the current build.
+        :returns: None
+        """
+
+        hrefs = set(hrefs)
+        for href in list(self.pages):
+            if href not in hrefs:
+                del self.pages[href]
+
+    def save(self):
+        """
+        Write the manifest to its json file.
+
+        -----
+        :returns: None
+        """
+
+        manifest = dict(version=MANIFEST_VERSION, pages=self.pages)
+        if not self.path.parent.exists():
+            self.path.parent.mkdir(parents=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+
+    def stylesheets(self, href):
+        """
+        Return the names of the stylesheets used by a page, so the stylesheets of pages that are not rendered again are still written.
+
+        -----
+        :param href: Href of the page.
+        :returns: List of stylesheet names.
+        """
+
+        entry = self.pages.get(href)
+        return list(entry['stylesheets']) if entry is not None else []
+
+    def dependencies(self, page):
+        """
+        Return the names of the templates a page depends on.
+
+        -----
+        :param page: Href or id of the page.
+        :returns: Sorted list of template names or None if the page is not in the manifest.
+        """
+
+        for href, entry in self.pages.items():
+            if page in (href, entry['page_id']):
+                return sorted(entry['dependencies'])
+        return None
+
+    def dependents(self, template):
+        """
+        Return the hrefs of the pages that depend on a template.
+
+        -----
+        :param template: Name of the template (file name without extension, such as 'snippet_card').
+        :returns: Sorted list of hrefs.
+        """
+
+        return sorted(href for href, entry in self.pages.items()
+                      if template in entry['dependencies'])
+
+
+def hash_text(text):
+    """
+    Return the sha1 hex digest of a string.
+
+    -----
+    :param text: Text to be hashed as string.
+    :returns: Hex digest as string.
+    """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def hash_files(paths):
+    """
+    Return a single sha1 hex digest for the names and contents of a collection of files.
+
+    -----
+    :param paths: Paths to the files to be hashed.
+    :returns: Hex digest as string.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        digest.update(path.name.encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def shared_inputs(settings):
+    """
+    Return the hashes of the inputs that are shared by all pages: the site properties and the build settings.
+
+    -----
+    :param settings: Build settings that affect the output as dictionary.
+    :returns: Input hashes as dictionary.
+    """
+    return {
+        'properties': hash_text(site_specs.SiteProperties.create_ini()),
+        'settings': hash_text(json.dumps(settings, sort_keys=True)),
+    }
+
+
+def template_hashes(path_templates):
+    """
+    Return the hashes of the base templates and snippets in the templates folder, indexed by their file name without extension (such as 'base_aside' or 'snippet_card').
+
+    -----
+    :param path_templates: Path to the templates folder.
+    :returns: Template hashes as dictionary.
+    """
+    templates = list(path_templates.glob('base*.html'))
+    templates += path_templates.glob('**/snippet_*.html')
+    return {path.stem: hash_files([path]) for path in templates}
+
+
+def referenced_templates(env, name):
+    """
+    Return the name of a template and the names of all templates it includes, extends or renders as fragment (recursively).
+
+    -----
+    :param env: jinja2 environment containing the template.
+    :param name: Name of the template.
+    :returns: Sorted list of template names.
+    """
+    import jinja2.meta
+    import jinja2.nodes
+
+    found = set()
+    stack = [name]
+    while stack:
+        name = stack.pop()
+        if name in found:
+            continue
+        found.add(name)
+        ast = env.parse(env.loader.get_source(env, name)[0])
+        stack.extend(reference for reference
+                     in jinja2.meta.find_referenced_templates(ast)
+                     if reference is not None)
+        for call in ast.find_all(jinja2.nodes.Call):
+            if (isinstance(call.node, jinja2.nodes.Name)
+                    and call.node.name == 'fragment'
+                    and call.args
+                    and isinstance(call.args[0], jinja2.nodes.Const)):
+                stack.append(call.args[0].value)
+    return sorted(found)
+
+
+def page_dependencies(templates, snippets, hashes):
+    """
+    Return the hashes of the templates a page depends on.
+
+    -----
+    :param templates: Names of the base templates used by the page.
+    :param snippets: Names of the snippets used by the page (without the 'snippet_' prefix).
+    :param hashes: Hashes of all templates as dictionary (see `template_hashes`).
+    :returns: Template hashes of the page as dictionary.
+    """
+    names = list(templates) + [f'snippet_{snippet}' for snippet in snippets]
+    return {name: hashes.get(name) for name in names}
+
+
+def print_dependencies(build_manifest, name=None):
+    """
+    Print the dependency graph stored in the manifest:
+    - Without a name: the templates every page depends on.
+    - With the name of a template: the pages that depend on it.
+    - With the href or id of a page: the templates it depends on.
+
+    -----
+    :param build_manifest: BuildManifest.
+    :param name: Optional name of a template or href or id of a page.
+    :returns: None
+    """
+
+    if name is None:
+        for href in sorted(build_manifest.pages):
+            print(f"{href}: {', '.join(build_manifest.dependencies(href))}")
+        return
+
+    dependencies = build_manifest.dependencies(name)
+    if dependencies is not None:
+        print(f'Page {name} depends on:')
+        for template in dependencies:
+            print(f'  {template}')
+        return
+
+    dependents = build_manifest.dependents(name)
+    if dependents:
+        print(f'Pages depending on {name}:')
+        for href in dependents:
+            print(f'  {href}')
+    else:
+        print(f'No pages depending on {name} found in the manifest.')
+
+
+def structure_inputs(structure, page_id, text):
+    """
+    Collect the navigational data that is rendered into a page. Apart from the page itself, this includes its neighbours in the SiteStructure:
+    - The sections and their hrefs (navigation bar).
+    - The sitemap of the section the page belongs to (aside).
+    - The previous and next page (header buttons).
+    - The crossrefs that occur within the page text.
+
+    -----
+    :param structure: SiteStructure of the site.
+    :param page_id: Id of the page.
+    :param text: Raw text of the page.
+    :returns: Navigational data of the page as json string.
+    """
+
+    navigation = structure.navigation(page_id)
+    codes = set(site_specs.CROSSREF_PATTERN.findall(text))
+    crossrefs = [(code, href) for code, href in structure.crossrefs
+                 if code in codes]
+    sitemap = [(chapter, list(groups.items()))
+               for chapter, groups in navigation.sitemap.items()]
+    inputs = [
+        structure[page_id]['Href'],
+        navigation._replace(sitemap=sitemap),
+        structure.href_sections,
+        crossrefs,
+        ]
+    return json.dumps(inputs, default=str)
+
+
+def page_inputs(content, structure, shared_inputs):
+    """
+    Return the input hashes of a page.
+
+    -----
+    :param content: PageContent of the page.
+    :param structure: SiteStructure of the site.
+    :param shared_inputs: Hashes of the inputs shared by all pages (properties and settings) as dictionary.
+    :returns: Input hashes of the page as dictionary.
+    """
+
+    text = content.page_id + '\n' + content.text
+    dates = content.ctime.strftime('%d-%m-%Y') + content.mtime.strftime('%d-%m-%Y')
+    inputs = dict(
+        markdown=hash_text(text + dates),
+        structure=hash_text(structure_inputs(structure,
+                                             content.page_id,
+                                             text)),
+        )
+    inputs.update(shared_inputs)
+    return inputs
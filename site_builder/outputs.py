@@ -0,0 +1,274 @@
+"""
+The outputs module
+==================
+This module writes the html files to the output folder. A file is only written if its contents changed, so the modification times of unchanged files are preserved and tools that synchronize the output folder (such as rsync or a CDN upload) only see the files that actually changed.
+
+Whether the contents changed is decided without reading the existing file: the OutputHashes record the hash, size and modification time of every file written by the site builder. If the size and modification time of the existing file still match the record, the file has not been touched since it was written and the recorded hash can be compared with the hash of the new contents. The record is stored as `.output_hashes.json` in the output folder.
+
+Files that changed are written to a temporary file next to the destination, which then replaces the destination. A file in the output folder is therefore never left half written. The text is hashed and written in chunks, so no encoded copy of the whole file is held in memory. As with files opened in text mode, newlines in the text are written as the line separator of the platform (`os.linesep`).
+
+Pages are written behind the rendering by a WriteBehind writer: the rendered pages are put in a bounded queue, which is drained by a writer thread. The next page is rendered while the previous pages are written, which matters most when writing is slow (such as on a network drive). The folders of the files in the queue are created in one go before writing them, and every folder is only created once.
+
+    Objects in this module
+    ----------------------
+    - OutputHashes (class)
+    - WriteBehind (class)
+    - write_text (function)
+    - write_bytes (function)
+"""
+
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+from concurrent.futures import Future
+
+
+CHUNK_SIZE = 64 * 1024  # Number of characters encoded at a time
+QUEUE_SIZE = 16  # Number of files waiting to be written before submit blocks
+
+
+class OutputHashes:
+    """
+    The OutputHashes class stores the hash, size and modification time of the files written to the output folder, indexed by their path relative to the output folder. The record is read from and saved to a json file.
+
+    An OutputHashes object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    get              Return the record of a file.
+    update           Store the record of a file.
+    retain           Drop all files that are not in the given paths.
+    save             Write the records to the json file.
+    ===============  =================================================
+    """
+
+    def __init__(self, path_record):
+        self.path = path_record
+        self.files = dict()
+        if self.path.exists():
+            try:
+                self.files = json.loads(self.path.read_text(encoding='utf-8'))
+            except ValueError:
+                pass
+
+    def get(self, relative):
+        """
+        Return the record of a file.
+
+        -----
+        :param relative: Path of the file relative to the output folder as string.
+        :returns: Record as list (hash, size, mtime_ns) or None.
+        """
+
+        return self.files.get(relative)
+
+    def update(self, relative, record):
+        """
+        Store the record of a file.
+
+        -----
+        :param relative: Path of the file relative to the output folder as string.
+        :param record: Record as returned by `write_text`.
+        :returns: None
+        """
+
+        self.files[relative] = list(record)
+
+    def retain(self, relatives):
+        """
+        Remove the records of the files that are not part of the current build.
+
+        -----
+        :param relatives: Paths of the files in the current build relative to the output folder.
+        :returns: None
+        """
+
+        relatives = set(relatives)
+        for relative in list(self.files):
+            if relative not in relatives:
+                del self.files[relative]
+
+    def save(self):
+        """
+        Write the records to the json file.
+
+        -----
+        :returns: None
+        """
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.files, f, indent=1, sort_keys=True)
+
+
+class WriteBehind:
+    """
+    The WriteBehind class writes text files (see `write_text`) in a writer thread. Files are submitted to a bounded queue, so rendering blocks when it gets too far ahead of writing and the number of rendered pages held in memory stays small. The writer takes all files waiting in the queue at once, creates the folders that do not exist yet and writes the files.
+
+    A WriteBehind object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    submit           Put a file in the queue.
+    flush            Wait until all submitted files are written.
+    close            Flush and stop the writer thread.
+    ===============  =================================================
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.folders = set()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, path, text, record=None):
+        """
+        Put a file in the queue of the writer thread. Blocks while the queue is full.
+
+        -----
+        :param path: Path to the file.
+        :param text: Contents of the file as string.
+        :param record: Record of the previous write of the file (see OutputHashes) or None.
+        :returns: Future with the result of `write_text` and the time it took to write the file in seconds.
+        """
+
+        future = Future()
+        self.queue.put((path, text, record, future))
+        return future
+
+    def flush(self):
+        """
+        Wait until all submitted files are written. If writing a file failed, the first error since the last flush is raised.
+
+        -----
+        :returns: None
+        """
+
+        self.queue.join()
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        """
+        Write the remaining files and stop the writer thread.
+
+        -----
+        :returns: None
+        """
+
+        self.queue.put(None)
+        self.thread.join()
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            batch = [item for item in batch if item is not None]
+            self._make_folders(path.parent for path, *_ in batch)
+            for path, text, record, future in batch:
+                start = time.perf_counter()
+                try:
+                    record, written = _write_text(path, text, record)
+                    future.set_result((record, written, time.perf_counter() - start))
+                except Exception as e:
+                    self.error = self.error or e
+                    future.set_exception(e)
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _make_folders(self, folders):
+        for folder in sorted(set(folders) - self.folders):
+            try:
+                folder.mkdir(parents=True, exist_ok=True)
+            except OSError:
+                continue  # Raised again when the file is written
+            self.folders.add(folder)
+
+
+def write_text(path, text, record=None):
+    """
+    Write text (utf-8, platform line endings) to a file, unless the file exists with the same contents according to the record of the previous write. Changed files are written to a temporary file, which then replaces the file.
+
+    -----
+    :param path: Path to the file.
+    :param text: Contents of the file as string.
+    :param record: Record of the previous write of the file (see OutputHashes) or None.
+    :returns: Record of the file as list (hash, size, mtime_ns) and whether the file was written as tuple.
+    """
+
+    return _write_text(path, text, record, make_folder=True)
+
+
+def _write_text(path, text, record, make_folder=False):
+    digest = hashlib.sha1()
+    for chunk in _encode(text):
+        digest.update(chunk)
+    digest = digest.hexdigest()
+    if record is not None and record[0] == digest:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        if stat is not None and [stat.st_size, stat.st_mtime_ns] == list(record[1:]):
+            return list(record), False
+
+    if make_folder:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    _replace(path, _encode(text))
+    stat = os.stat(path)
+    return [digest, stat.st_size, stat.st_mtime_ns], True
+
+
+def write_bytes(path, data):
+    """
+    Write bytes to a file, unless the file exists with the same contents. The existing file is compared directly, so this is meant for small files that are not recorded in the OutputHashes (such as the shards of the search index).
+
+    -----
+    :param path: Path to the file.
+    :param data: Contents of the file as bytes.
+    :returns: True if the file was written.
+    """
+
+    try:
+        if path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _replace(path, [data])
+    return True
+
+
+def _replace(path, chunks):
+    path_tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(path_tmp, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(path_tmp, path)
+    finally:
+        if path_tmp.exists():
+            path_tmp.unlink()
+
+
+def _encode(text):
+    for position in range(0, len(text), CHUNK_SIZE):
+        chunk = text[position:position + CHUNK_SIZE]
+        if os.linesep != '\n':
+            chunk = chunk.replace('\n', os.linesep)
+        yield chunk.encode('utf-8')
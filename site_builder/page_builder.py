@@ -1,10 +1,7 @@
 """
 THe page_builder module
 =======================
-This module contains the PageBuilder class which takes care of rendering the page sections and assembling them. Upon initialization the module:
-- Loads all templates from the designated templates folder.
-- Finds all stylesheets in the designated templates folder.
-- Maps all functions from the section_processing module.
+This module contains the PageBuilder class which takes care of rendering the page sections and assembling them. Upon initialization the module maps all functions from the section_processing module. Loading the templates and finding the stylesheets in the designated templates folder is left to the build context (see `build.init_build`), so importing this module does not touch the templates folder or import jinja2.
 
 First instantiate the SiteStructure and set it to the PageBuilder structure attribute. After this you can instantiate PageBuilder objects by feeding it PageContent objects. The PageContent can be rendered as html with the build_page method.
 
@@ -16,13 +13,14 @@ First instantiate the SiteStructure and set it to the PageBuilder structure attr
     - load_templates (function)
 """
 
+import re
 import inspect
-import jinja2
-import datetime as dt
-from bs4 import BeautifulSoup
 from site_builder import config
 from site_builder import site_specs
 from site_builder import section_processing
+from site_builder import html_format
+from site_builder import profiling
+from site_builder import search
 
 
 class PageBuilder:
@@ -32,24 +30,24 @@ class PageBuilder:
         - The navigational data from SiteStructure.
         - The processing functions from the section_processing module.
         - The jinja base templates loaded from the templates folder.
-        - The prettify function from BeautifulSoup.
+        - The format_html function from the html_format module.
 
-    Upon initialization the page_builder module:
-    1. Loads all templates in the templates folder.
-    2. Maps all available rendering functions in the section_processing module.
-    3. Creates a list of all available stylesheets from the templates folder.
+    Upon initialization the page_builder module maps all available rendering functions in the section_processing module. The build context (see `build.init_build`) loads all templates in the templates folder and creates a list of all available stylesheets from the templates folder.
 
-    The PageBuilder class also keeps track of which stylesheets are used by the instances of the class. After rendering all the pages, this class variable can be used to collect only the relevant stylesheets for packaging with the website (currently not implemented).
+    Rendered sections are stored in the SectionCache of the PageBuilder (if set by the build context), so sections that occur on several pages or in several builds are rendered once (see the section_cache module).
+
+    Every PageBuilder object keeps track of which stylesheets are used by its page. The stylesheets of the page are passed through the StylesheetPipeline (see the stylesheets module), which returns the names of the stylesheets the page links. After rendering all the pages, the stylesheets used per page are written with the same pipeline, so only the relevant stylesheets are packaged with the website. No state is collected on the class while rendering, so the memory used does not grow with the number of pages.
 
     A PageBuilder object is initialized with the following attributes:
     ==============  ==================================================
     Attribute       Description
     ==============  ==================================================
     page_id         Page id
+    navigation      PageNavigation from SiteStructure
     page_name       Page name
     sections        Content dictionary from PageContent
     ctime           Time of creation for the md file
-    mtim            Time of last modification of the md file
+    mtime           Time of last modification of the md file
     ==============  ==================================================
 
     The following attributes are created by the PageBuilder object using the build_page method:
@@ -57,6 +55,9 @@ class PageBuilder:
     Attribute       Description
     ==============  ==================================================
     stylesheets     List of stylesheets used in the page
+    snippets        List of snippets used in the page
+    terms           Terms of the rendered sections for the search index
+    unresolved      List of crossref codes that were not found
     page_content    Rendered content without navigation
     page            Fully rendered html output
     ==============  ==================================================
@@ -75,29 +76,45 @@ class PageBuilder:
     PageEnv = None
     function_mapping = None
     available_stylesheets = None
-    used_stylesheets = set()
+    stylesheet_pipeline = None
+    section_cache = None
+    timestamps = None
+    search = False
+    sitemap_stylesheets = ['styles_sitemap.css']
+    search_stylesheet = 'styles_search.css'
+    output_format = 'pretty'
+    crossref_pattern = site_specs.CROSSREF_PATTERN
+    unresolved_pattern = re.compile(r'[\w.\-]+')
+    code_block_pattern = re.compile(r'<(code|pre)\b.*?</\1>', re.DOTALL)
+    shape_pattern = re.compile(r'[A-Z]+|[a-z]+|[0-9]+')
+    code_shapes = (None, frozenset())  # Crossrefs of the SiteStructure and the shapes of their codes
     watermark = """
     <!-- This site was built with the site builder at https://github.com/lcvriend/responsive_static_site_builder licensed under the GNU General Public License v3.0. -->
     """
 
     def __init__(self, content):
         self.page_id = content.page_id
-        self.page_name = PageBuilder.structure[self.page_id]['Page']
+        self.navigation = PageBuilder.structure.navigation(self.page_id)
+        self.page_name = self.navigation.page
         self.page_content = ''
         self.page = ''
         self.sections = content.sections
         self.ctime = content.ctime
         self.mtime = content.mtime
         self.stylesheets = []
+        self.snippets = []
+        self.unresolved = []
+        self.terms = None
 
     def build_page(self):
         """
         Build a page from the loaded PageContent:
             1. Render all sections of the page and return the html.
-            2. Convert all crossref codes to working crossref links.
-            3. Render the page within the site template (adds navigation etc.)
-            4. Prettify the html output with BeautifulSoup.
-            5. Return the page.
+            2. Store the terms of the rendered sections for the search index (see the search module).
+            3. Convert all crossref codes to working crossref links.
+            4. Render the page within the site template (adds navigation etc.)
+            5. Format the html output according to the output format (see the html_format module).
+            6. Return the page.
 
         -----
         :returns: The rendered and finalized html page as string.
@@ -112,33 +129,42 @@ class PageBuilder:
             'version': PageBuilder.properties.version,
             'footer_contact': PageBuilder.properties.footer_contact,
             'footer_info': PageBuilder.properties.footer_info,
-            'stylesheets': self.stylesheets,
             'current_page_id': self.page_id,
             'current_page': self.page_name,
-            'current_chapter': PageBuilder.structure[self.page_id]['Chapter'],
-            'current_section': PageBuilder.structure[self.page_id]['Section'],
-            'breadcrumbs': PageBuilder.structure.breadcrumbs(self.page_id),
-            'nest': '../' * PageBuilder.structure[self.page_id]['Href_nest'],
+            'current_chapter': self.navigation.chapter,
+            'current_section': self.navigation.section,
+            'breadcrumbs': self.navigation.breadcrumbs,
+            'nest': self.navigation.nest,
             'sections_href': PageBuilder.structure.href_sections,
-            'adjacent': PageBuilder.structure.adjacent_pages(self.page_id),
-            'sitemap': PageBuilder.structure.sitemap()[PageBuilder.structure[self.page_id]['Section']],
+            'adjacent': self.navigation.adjacent,
+            'sitemap': self.navigation.sitemap,
             'set_navigation': True,
+            'search': PageBuilder.search,
         }
 
         page_variables['content'] = self.render_sections(page_variables)
+        if PageBuilder.search:
+            with profiling.measure('search', self.page_id):
+                self.terms = search.index_terms(page_variables['content'])
+        self.stylesheets.extend(PageBuilder.feature_stylesheets())
+        page_variables['stylesheets'] = PageBuilder.stylesheet_pipeline.links(self.stylesheets)
         if page_variables['content'] == '':
             page_variables['content'] = f'<p>{PageBuilder.properties.tbd}</p>'
-        page_variables['content'] = self.set_crossrefs(page_variables)
-
-        self.page = self.render_page('base', page_variables)
-        self.page = BeautifulSoup(self.page, 'lxml').prettify()
+        with profiling.measure('crossrefs', self.page_id):
+            page_variables['content'] = self.set_crossrefs(page_variables, self.unresolved)
+
+        with profiling.measure('render', self.page_id):
+            self.page = self.render_page('base', page_variables)
+        del page_variables  # Release the rendered sections before formatting
+        with profiling.measure(f'format:{PageBuilder.output_format}', self.page_id):
+            self.page = html_format.format_html(self.page, PageBuilder.output_format)
         self.page = self.page + PageBuilder.watermark
         return self.page
 
     @staticmethod
     def render_page(template, page_variables):
         """
-        Pass the page variables through the selected template in jinja2 and return the rendered page.
+        Pass the page variables through the selected template in jinja2 and return the rendered page. The page variables are passed as render context, so the (cached) template itself is never modified.
 
         -----
         :param page_variables: Specification of the page as dictionary.
@@ -146,55 +172,128 @@ class PageBuilder:
         """
 
         page = PageBuilder.PageEnv.get_template(template)
-        page.globals = page_variables
-        return page.render()
+        return page.render(page_variables)
 
     @staticmethod
-    def set_crossrefs(page_variables):
+    def set_crossrefs(page_variables, unresolved=None):
         """
-        Check for crossref [codes] defined in the SiteStructure within the page and convert them to crossref format.
+        Check for crossref [codes] defined in the SiteStructure within the page and convert them to crossref format. The page is scanned once for bracketed text, which is looked up in the crossrefs of the SiteStructure.
+
+        Bracketed text that is not defined in the SiteStructure is left as is. It is added to the unresolved list if it has the shape of the codes in the SiteStructure (see `code_shape`), so a misspelled code is reported while other bracketed text is not. Bracketed text within `<code>` or `<pre>` and directly after a word (such as `arr[i]`) is never reported.
 
         -----
         :param page_variables: Specification of the page as dictionary.
+        :param unresolved: Optional list to which unresolved codes are appended.
         :returns: html where each occurrence of [code] is replaced by crossreferencing link.
         """
 
-        content = page_variables['content']
         nest = page_variables['nest']
-        for code, href in PageBuilder.structure.crossrefs:
-            if code == code:
-                crossref = f'<a class="crossref" href="{nest}{href}">{code}</a>'
-                content = content.replace('[' + code + ']', crossref)
-        return content
+        content = page_variables['content']
+        crossref_hrefs = PageBuilder.structure.crossref_hrefs
+        code_blocks = None
+
+        def is_unresolved(match):
+            nonlocal code_blocks
+            code = match.group(1)
+            if not PageBuilder.unresolved_pattern.fullmatch(code):
+                return False
+            if PageBuilder.code_shape(code) not in PageBuilder.shapes(crossref_hrefs):
+                return False
+            start = match.start()
+            if start > 0 and (content[start - 1].isalnum() or content[start - 1] == '_'):
+                return False
+            if code_blocks is None:
+                code_blocks = [block.span() for block in PageBuilder.code_block_pattern.finditer(content)]
+            return not any(block_start < start < block_end for block_start, block_end in code_blocks)
+
+        def replace(match):
+            code = match.group(1)
+            href = crossref_hrefs.get(code)
+            if href is None:
+                if unresolved is not None and is_unresolved(match):
+                    unresolved.append(code)
+                return match.group(0)
+            return f'<a class="crossref" href="{nest}{href}">{code}</a>'
+
+        return PageBuilder.crossref_pattern.sub(replace, content)
+
+    @staticmethod
+    def code_shape(code):
+        """
+        Return the shape of a crossref code: every run of capitals, lower case letters or digits is replaced by 'A', 'a' or '0' (so 'SA-01' becomes 'A-0').
+
+        -----
+        :param code: Crossref code as string.
+        :returns: Shape as string.
+        """
+
+        def shape(match):
+            char = match.group(0)[0]
+            return 'A' if char.isupper() else 'a' if char.islower() else '0'
+
+        return PageBuilder.shape_pattern.sub(shape, code)
+
+    @classmethod
+    def shapes(cls, crossref_hrefs):
+        """
+        Return the shapes of the crossref codes in the SiteStructure (see `code_shape`). The shapes are computed once per SiteStructure.
+
+        -----
+        :param crossref_hrefs: Crossref codes with their hrefs as dictionary.
+        :returns: Shapes as frozenset.
+        """
+
+        if cls.code_shapes[0] is not crossref_hrefs:
+            cls.code_shapes = (crossref_hrefs, frozenset(cls.code_shape(code) for code in crossref_hrefs))
+        return cls.code_shapes[1]
 
     def render_sections(self, page_variables):
         """
-        Render all sections of the page into html and combine them.
+        Render all sections of the page into html and combine them. The names of the snippets used by the sections are stored in the snippets attribute. Sections are taken from the SectionCache if possible and stored in it after rendering. The ids within a section are replaced by ids derived from the page id and the position of the section (see `section_processing._set_ids`).
 
         -----
         :param page_variables: Specification of the page as dictionary.
         :returns: Rendered page as html.
         """
         content = ''
-        for section in self.sections:
+        snippets = set()
+        cache = PageBuilder.section_cache
+        for position, section in enumerate(self.sections):
             text = section['text']
             function = section['function']
             arg = section['arg']
             if arg in page_variables:
                 arg = page_variables[arg]
-            try:
-                render = self.dispatcher(text, function, arg)
-            except:
-                print(f'Rendering page with {function} {arg} failed on:')
-                print(text)
-                print('Skipping this passage.')
-                render = ''
+            cached = None
+            if cache is not None and function in PageBuilder.function_mapping:
+                with profiling.measure('section_cache', self.page_id):
+                    cached = cache.get(function, arg, text)
+            if cached is not None:
+                render, section_snippets = cached
+                snippets.update(section_snippets)
+            else:
+                section_processing.used_snippets.clear()
+                try:
+                    with profiling.measure(f'section:{function}', self.page_id):
+                        render = self.dispatcher(text, function, arg)
+                except:
+                    print(f'Rendering page with {function} {arg} failed on:')
+                    print(text)
+                    print('Skipping this passage.')
+                    render = ''
+                else:
+                    if cache is not None and function in PageBuilder.function_mapping:
+                        cache.put(function, arg, text, render,
+                                  section_processing.used_snippets)
+                snippets.update(section_processing.used_snippets)
+            render = section_processing._set_ids(render, self.page_id, position)
 
             content = '\n'.join([content, render])
             if function in PageBuilder.available_stylesheets:
                 stylesheet_name = f'styles_{function}.css'
-                self.stylesheets.append(stylesheet_name)
-                PageBuilder.used_stylesheets.add(stylesheet_name)
+                if stylesheet_name not in self.stylesheets:
+                    self.stylesheets.append(stylesheet_name)
+        self.snippets = sorted(snippets)
         return content
 
     @classmethod
@@ -206,7 +305,7 @@ class PageBuilder:
         :returns: Rendered sitemap as html.
         """
 
-        time = dt.datetime.now().strftime('%d-%m-%Y')
+        time = cls.timestamps.build_date().strftime('%d-%m-%Y')
 
         page_variables = {
             'cdate': time,
@@ -216,7 +315,7 @@ class PageBuilder:
             'version': cls.properties.version,
             'footer_contact': cls.properties.footer_contact,
             'footer_info': cls.properties.footer_info,
-            'stylesheets': ['styles_sitemap.css'],
+            'stylesheets': cls.stylesheet_pipeline.links(cls.sitemap_stylesheets + cls.feature_stylesheets()),
             'current_page': 'Sitemap',
             'breadcrumbs': 'Sitemap',
             'nest': '',
@@ -224,11 +323,23 @@ class PageBuilder:
             'sitemap': cls.structure.sitemap(),
             'adjacent': None,
             'set_navigation': False,
+            'search': cls.search,
         }
         page = cls.render_page('base_sitemap', page_variables)
-        page = BeautifulSoup(page, 'lxml').prettify()
+        page = html_format.format_html(page, cls.output_format)
         return page
 
+    @classmethod
+    def feature_stylesheets(cls):
+        """
+        Return the stylesheets of the parts of the page that can be switched off, such as the search widget in the navigation bar.
+
+        -----
+        :returns: Names of the stylesheets as list.
+        """
+
+        return [cls.search_stylesheet] if cls.search else []
+
     @classmethod
     def dispatcher(cls, text, function, arg):
         """
@@ -286,23 +397,37 @@ def find_stylesheets():
     return stylesheets
 
 
-def load_templates():
+def load_templates(base_templates=None):
     """
-    Load base templates from the project templates folder in a jinja2 environment.
+    Load base templates from the project templates folder in a jinja2 environment. The compiled templates are stored in a bytecode cache in the cache folder, so they are only compiled again if their source changed. The functions of a new FragmentCache (see the fragments module) are added to the globals of the environment and the FragmentCache is stored as its `fragment_cache` attribute.
 
     -----
+    :param base_templates: Optional dictionary of template names and sources to use instead of the templates folder.
     :returns: Base templates as jinja2 enivronment.
     """
-    base_templates = dict()
-    for base_template in config.PATH_CONFIG['templates'].glob('base*.html'):
-        template_name = base_template.stem
-        template = base_template.read_text(encoding='utf-8')
-        base_templates[template_name] = template
-    return jinja2.Environment(loader=jinja2.DictLoader(base_templates), trim_blocks=True, lstrip_blocks=True)
+    import jinja2
+    from site_builder.fragments import FragmentCache
+
+    if base_templates is None:
+        base_templates = dict()
+        for base_template in config.PATH_CONFIG['templates'].glob('base*.html'):
+            template_name = base_template.stem
+            template = base_template.read_text(encoding='utf-8')
+            base_templates[template_name] = template
+    path_cache = config.PATH_CONFIG['cache'] / 'jinja2'
+    path_cache.mkdir(parents=True, exist_ok=True)
+    bytecode_cache = jinja2.FileSystemBytecodeCache(str(path_cache), '__base_%s.cache')
+    env = jinja2.Environment(loader=jinja2.DictLoader(base_templates),
+                             bytecode_cache=bytecode_cache,
+                             trim_blocks=True,
+                             lstrip_blocks=True)
+    fragment_cache = FragmentCache(env)
+    env.globals['fragment'] = fragment_cache.fragment
+    env.globals['highlight'] = fragment_cache.highlight
+    env.fragment_cache = fragment_cache
+    return env
 
 
 # Initialize class constants
-PageBuilder.PageEnv = load_templates()
 PageBuilder.function_mapping = build_function_mapping()
-PageBuilder.available_stylesheets = find_stylesheets()
 PageBuilder.properties = site_specs.properties
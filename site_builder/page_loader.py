@@ -28,13 +28,14 @@ class PageContent:
     """
     The PageContent class is used to collect all sections in a page. Page sections are stored as a dictionary. These dictionaries contain the recipe for parsing the section into the correct html.
 
-    The class can be instantiated from a markdown file by using the function read_md. Indexing the instance will return the section at the given index. Iterating over the instance will return all sections.
+    The class can be instantiated from a markdown file by using the function read_md. Indexing the instance will return the section at the given index. Iterating over the instance will return all sections. The raw page text is kept as `text`.
     """
 
     def __init__(self, page_id, page_text, ctime, mtime):
         self.page_id = page_id
         self.ctime = ctime
         self.mtime = mtime
+        self.text = page_text
         self.sections = self._extract_sections(page_text)
 
     def __iter__(self):
@@ -87,7 +88,7 @@ class PageContent:
         return out_sections
 
 
-def read_md(file_path_md, page_ids):
+def read_md(file_path_md, page_ids, timestamps=None):
     """
     Read markdown file and check its page id. If the page id exists within the
     site structure return an instance of PageContent, else return None.
@@ -99,10 +100,14 @@ def read_md(file_path_md, page_ids):
 
     -----
     :param file_path: Path to the markdown file to be read.
+    :param timestamps: Optional Timestamps that decide the creation and modification time (see the timestamps module).
     :returns: Instance of PageContent or None if no valid page_id/text_body is found.
     """
-    ctime = dt.datetime.fromtimestamp(file_path_md.stat().st_ctime)
-    mtime = dt.datetime.fromtimestamp(file_path_md.stat().st_mtime)
+    if timestamps is not None:
+        ctime, mtime = timestamps.page_dates(file_path_md)
+    else:
+        ctime = dt.datetime.fromtimestamp(file_path_md.stat().st_ctime)
+        mtime = dt.datetime.fromtimestamp(file_path_md.stat().st_mtime)
     md = file_path_md.read_text(encoding='utf-8')
 
     if not '\n' in md:
@@ -0,0 +1,269 @@
+"""
+The profiling module
+====================
+This module records where the time (and memory) of a build goes. Profiling is switched off by default. When it is switched on (with the 'profile' flag of the build site script), every measured phase of the build results in a record containing:
+
+=======  =========================================================
+Key      Value
+=======  =========================================================
+phase    Name of the phase (e.g. 'read_md' or 'section:table')
+page     Page id (None for phases that are not tied to a page)
+time     Wall time in seconds
+memory   Net change in allocated memory in bytes
+peak     Peak of allocated memory during the phase in bytes
+depth    Nesting depth of the phase
+=======  =========================================================
+
+Memory is traced with tracemalloc, which slows down the build considerably. The timings are therefore only meaningful relative to each other.
+
+The records are collected per process. Worker processes return the records of a page with its PageResult (see `take`), after which they are added to the profiler of the main process with `extend`.
+
+The pages are written by a writer thread (see the outputs module). The 'enqueue' phase of a page is the time spent handing it to the writer (which includes waiting while the queue of the writer is full), the 'write' phase is the time the writer thread spent writing it (see `timed`).
+
+    Objects in this module
+    ----------------------
+    - Profiler (class)
+    - enable (function)
+    - is_enabled (function)
+    - measure (function)
+    - mark (function)
+    - take (function)
+    - extend (function)
+    - timed (function)
+    - summarize (function)
+    - write_report (function)
+    - print_report (function)
+    - SORT_KEYS (constant)
+"""
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict
+
+
+SORT_KEYS = ['time', 'memory', 'peak', 'count']
+
+_profiler = None
+_null = nullcontext(dict())
+
+
+class Profiler:
+    """
+    The Profiler class measures phases of the build and stores a record for every phase.
+
+    A Profiler object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    measure          Context manager that measures a phase.
+    ===============  =================================================
+    """
+
+    def __init__(self):
+        self.records = list()
+        self._stack = list()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def measure(self, phase, page=None):
+        """
+        Measure the wall time and memory allocation of the code within the context. The record is yielded, so the page can be set after the context has been entered.
+
+        The peak of a phase is measured by resetting the tracemalloc peak. The peak of the enclosing phase is kept on a stack, so phases can be nested.
+
+        -----
+        :param phase: Name of the phase as string.
+        :param page: Optional page id.
+        :returns: Record of the phase as dictionary.
+        """
+
+        record = dict(phase=phase, page=page, depth=len(self._stack))
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([current, 0])
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['time'] = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            start_memory, child_peak = self._stack.pop()
+            peak = max(peak, child_peak)
+            record['memory'] = current - start_memory
+            record['peak'] = peak - start_memory
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self.records.append(record)
+
+
+def enable():
+    """
+    Switch on profiling in the current process.
+
+    -----
+    :returns: None
+    """
+
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+
+
+def is_enabled():
+    """
+    Check if profiling is switched on in the current process.
+
+    -----
+    :returns: True if profiling is switched on.
+    """
+
+    return _profiler is not None
+
+
+def measure(phase, page=None):
+    """
+    Measure a phase of the build (see `Profiler.measure`). If profiling is switched off this returns a context manager that does nothing.
+
+    -----
+    :param phase: Name of the phase as string.
+    :param page: Optional page id.
+    :returns: Context manager yielding the record of the phase.
+    """
+
+    if _profiler is None:
+        return _null
+    return _profiler.measure(phase, page)
+
+
+def mark():
+    """
+    Return the position of the next record, to be used with `take`.
+
+    -----
+    :returns: Number of records as integer.
+    """
+
+    if _profiler is None:
+        return 0
+    return len(_profiler.records)
+
+
+def take(position):
+    """
+    Remove the records from the given position onwards and return them.
+
+    -----
+    :param position: Position as returned by `mark`.
+    :returns: List of records.
+    """
+
+    if _profiler is None:
+        return []
+    records = _profiler.records[position:]
+    del _profiler.records[position:]
+    return records
+
+
+def extend(records):
+    """
+    Add records (from a worker process) to the profiler.
+
+    -----
+    :param records: List of records.
+    :returns: None
+    """
+
+    if _profiler is not None:
+        _profiler.records.extend(records)
+
+
+def timed(phase, seconds, page=None):
+    """
+    Return the record of a phase that was timed outside of the profiler (such as writing a page in the writer thread, see the outputs module). The memory of such a phase is not traced.
+
+    -----
+    :param phase: Name of the phase as string.
+    :param seconds: Wall time in seconds.
+    :param page: Optional page id.
+    :returns: Record of the phase as dictionary.
+    """
+
+    return dict(phase=phase, page=page, depth=0, time=seconds, memory=0, peak=0)
+
+
+def summarize(records, sort='time'):
+    """
+    Aggregate the records per phase and per page. Only top level records (depth 0) count towards the totals of a page, so nested phases are not counted twice.
+
+    -----
+    :param records: List of records.
+    :param sort: Key to sort the aggregates on (one of SORT_KEYS).
+    :returns: Aggregates per phase and per page as dictionary of lists.
+    """
+
+    phases = defaultdict(lambda: dict(time=0.0, memory=0, peak=0, count=0))
+    pages = defaultdict(lambda: dict(time=0.0, memory=0, peak=0, count=0))
+    for record in records:
+        aggregates = [phases[record['phase']]]
+        if record['page'] is not None and record['depth'] == 0:
+            aggregates.append(pages[record['page']])
+        for aggregate in aggregates:
+            aggregate['time'] += record['time']
+            aggregate['memory'] += record['memory']
+            aggregate['peak'] = max(aggregate['peak'], record['peak'])
+            aggregate['count'] += 1
+
+    def sort_aggregates(aggregates, name):
+        items = [dict({name: key}, **values) for key, values in aggregates.items()]
+        return sorted(items, key=lambda item: item[sort], reverse=True)
+
+    return dict(phases=sort_aggregates(phases, 'phase'),
+                pages=sort_aggregates(pages, 'page'))
+
+
+def write_report(path, sort='time'):
+    """
+    Write the profiling report as json. The report contains the aggregates per phase and per page as well as all records.
+
+    -----
+    :param path: Path to the json file.
+    :param sort: Key to sort the aggregates on (one of SORT_KEYS).
+    :returns: None
+    """
+
+    records = _profiler.records if _profiler is not None else []
+    report = summarize(records, sort)
+    report['records'] = records
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1, default=str)
+
+
+def print_report(top=10, sort='time'):
+    """
+    Print the top N phases and pages of the profiling report as tables.
+
+    -----
+    :param top: Number of rows per table.
+    :param sort: Key to sort the aggregates on (one of SORT_KEYS).
+    :returns: None
+    """
+
+    records = _profiler.records if _profiler is not None else []
+    report = summarize(records, sort)
+    for name in ['phase', 'page']:
+        aggregates = report[f'{name}s'][:top]
+        width = max([len(name)] + [len(str(item[name])) for item in aggregates])
+        print(f'\nTop {len(aggregates)} {name}s by {sort}:')
+        print(f'{name:<{width}}  {"time (s)":>10}  {"memory (kB)":>12}  {"peak (kB)":>10}  {"count":>6}')
+        for item in aggregates:
+            print(f'{str(item[name]):<{width}}  '
+                  f'{item["time"]:>10.4f}  '
+                  f'{item["memory"] / 1024:>12.1f}  '
+                  f'{item["peak"] / 1024:>10.1f}  '
+                  f'{item["count"]:>6}')
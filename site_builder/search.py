@@ -0,0 +1,250 @@
+"""
+The search module
+=================
+This module builds the full-text search index of the site, which is searched in the browser by the search widget in the navigation bar (see `search.js` in the templates folder).
+
+The text of a page is tokenized when the page is rendered: after the sections are rendered and before they are placed in the base template, so the navigation, aside and footer are not indexed. The terms of every page are stored with their positions within the page, which makes it possible to search for phrases ("student administration"). The terms of a page are written to the `.search` folder in the output folder by the process that renders the page.
+
+The index itself is split into a shard per section of the site, which is written (compressed with gzip) to the `search` folder in the output folder. A list of the shards is written to `search/index.json`. The search widget loads a shard only when searching, one shard at a time starting with the section of the current page, and shows the results as every shard arrives. Shards are only written again if a page within their section was rendered, or if the pages within the section changed. When building incrementally (see the manifest module), the terms of pages that are skipped are still in the `.search` folder, so the index is updated without tokenizing these pages again.
+
+The search index is built unless `search` in the BUILD section of `config.ini` is set to 'no' (or the build site script is flagged with 'no_search'). The widget is styled by `styles_search.css`, which is only linked by the pages if the search index is built.
+
+A shard is a json object with the following keys:
+========  =====================================================================
+Key       Description
+========  =====================================================================
+section   Name of the section
+pages     Href, page name and chapter of every page in the section
+terms     For every term a list of postings: the index of the page followed by the positions of the term, encoded as the difference with the previous position
+========  =====================================================================
+
+    Objects in this module
+    ----------------------
+    - SearchIndex (class)
+    - tokenize (function)
+    - index_terms (function)
+    - write_page_terms (function)
+    - has_page_terms (function)
+"""
+
+import re
+import json
+import gzip
+import html
+import shutil
+import hashlib
+from site_builder import outputs
+
+
+SEARCH_FOLDER = 'search'
+TERMS_FOLDER = '.search'
+SCRIPT = 'search.js'
+INDEX_VERSION = 1
+MAX_TERM_LENGTH = 40
+
+_IGNORED = re.compile(r'<(script|style)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+_TAG = re.compile(r'<[^>]*>')
+_WORD = re.compile(r'\w+')
+_SLUG = re.compile(r'[^\w\-]+')
+
+
+class SearchIndex:
+    """
+    The SearchIndex class writes the shards of the search index for the pages of a build. The shards that were written by the previous build are read from `.search/shards.json`, so only the shards of the sections that changed are written again.
+
+    A SearchIndex object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    write            Write the shards of the changed sections.
+    remove           Remove the search index from the output folder.
+    ===============  =================================================
+    """
+
+    def __init__(self, path_output):
+        self.path = path_output / SEARCH_FOLDER
+        self.path_terms = path_output / TERMS_FOLDER
+        self.shards = dict()
+        path_shards = self.path_terms / 'shards.json'
+        if path_shards.exists():
+            try:
+                shards = json.loads(path_shards.read_text(encoding='utf-8'))
+            except ValueError:
+                shards = dict()
+            if shards.get('version') == INDEX_VERSION:
+                self.shards = shards['shards']
+
+    def write(self, structure, pages, rendered, path_script):
+        """
+        Write the shards of the sections that contain a rendered page or whose pages changed, remove the shards and terms of sections and pages that are no longer part of the site and write the list of shards and the search script.
+
+        -----
+        :param structure: SiteStructure of the site.
+        :param pages: Href and page id of every page in the build as iterable of tuples.
+        :param rendered: Hrefs of the pages that were rendered in this build.
+        :param path_script: Path to the search script.
+        :returns: Names of the written shards as list.
+        """
+
+        rendered = set(rendered)
+        sections = {section: list() for section in structure.sections}
+        changed = set()
+        for href, page_id in pages:
+            record = structure[page_id]
+            sections.setdefault(record['Section'], list()).append(
+                [href, record['Page'], record['Chapter']])
+            if href in rendered:
+                changed.add(record['Section'])
+
+        shards = dict()
+        files = set()
+        written = list()
+        for section, entries in sections.items():
+            if not entries:
+                continue
+            entries.sort()
+            file = _shard_name(section, files)
+            files.add(file)
+            shard = dict(file=file, pages=entries)
+            key = str(section)
+            if (section in changed
+                    or self.shards.get(key) != shard
+                    or not (self.path / file).exists()):
+                if outputs.write_bytes(self.path / file, self._build_shard(section, entries)):
+                    written.append(file)
+            shards[key] = shard
+
+        hrefs = {entry[0] for shard in shards.values() for entry in shard['pages']}
+        self._remove_stale(files, hrefs)
+
+        index = dict(version=INDEX_VERSION,
+                     shards=[dict(section=key, file=shard['file'])
+                             for key, shard in shards.items()])
+        outputs.write_bytes(self.path / 'index.json',
+                            json.dumps(index, ensure_ascii=False).encode('utf-8'))
+        if path_script.exists():
+            outputs.write_bytes(self.path / SCRIPT, path_script.read_bytes())
+
+        self.shards = shards
+        outputs.write_bytes(self.path_terms / 'shards.json',
+                            json.dumps(dict(version=INDEX_VERSION, shards=shards)).encode('utf-8'))
+        return written
+
+    def remove(self):
+        """
+        Remove the search index and the terms of the pages from the output folder.
+
+        -----
+        :returns: None
+        """
+
+        for path in [self.path, self.path_terms]:
+            if path.exists():
+                shutil.rmtree(path)
+        self.shards = dict()
+
+    def _build_shard(self, section, entries):
+        terms = dict()
+        for idx, (href, *_) in enumerate(entries):
+            path = _terms_path(self.path_terms, href)
+            try:
+                page_terms = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            for term, positions in page_terms.items():
+                terms.setdefault(term, list()).append([idx] + positions)
+        shard = dict(section=section,
+                     pages=entries,
+                     terms=dict(sorted(terms.items())))
+        text = json.dumps(shard, ensure_ascii=False, separators=(',', ':'))
+        return gzip.compress(text.encode('utf-8'), compresslevel=6, mtime=0)
+
+    def _remove_stale(self, files, hrefs):
+        if self.path.exists():
+            for path in self.path.glob('*.json.gz'):
+                if path.name not in files:
+                    path.unlink()
+        if self.path_terms.exists():
+            keep = {_terms_path(self.path_terms, href).name for href in hrefs}
+            for path in self.path_terms.glob('page_*.json'):
+                if path.name not in keep:
+                    path.unlink()
+
+
+def tokenize(text):
+    """
+    Split the text of an html fragment into terms: scripts, styles and tags are removed, entities are unescaped and the remaining text is lowercased and split into words.
+
+    -----
+    :param text: Html as string.
+    :returns: Terms as list of strings.
+    """
+
+    text = _TAG.sub(' ', _IGNORED.sub(' ', text))
+    words = _WORD.findall(html.unescape(text).lower())
+    return [word for word in words if len(word) <= MAX_TERM_LENGTH]
+
+
+def index_terms(text):
+    """
+    Return the terms of an html fragment with their positions. The positions are encoded as the difference with the previous position, which keeps the numbers in the index small.
+
+    -----
+    :param text: Html as string.
+    :returns: Dictionary of terms and positions.
+    """
+
+    terms = dict()
+    for position, term in enumerate(tokenize(text)):
+        terms.setdefault(term, list()).append(position)
+    for positions in terms.values():
+        for idx in range(len(positions) - 1, 0, -1):
+            positions[idx] -= positions[idx - 1]
+    return terms
+
+
+def write_page_terms(path_output, href, terms, writer=None):
+    """
+    Write the terms of a page to the `.search` folder in the output folder.
+
+    -----
+    :param path_output: Path to the output folder.
+    :param href: Href of the page.
+    :param terms: Terms of the page as returned by `index_terms`.
+    :param writer: WriteBehind that writes the file, else it is written right away.
+    :returns: None
+    """
+
+    text = json.dumps(terms, ensure_ascii=False, separators=(',', ':'))
+    path = _terms_path(path_output / TERMS_FOLDER, href)
+    if writer is not None:
+        writer.submit(path, text)
+    else:
+        outputs.write_text(path, text)
+
+
+def has_page_terms(path_output, href):
+    """
+    Check if the terms of a page are stored in the `.search` folder in the output folder.
+
+    -----
+    :param path_output: Path to the output folder.
+    :param href: Href of the page.
+    :returns: True if the terms of the page are stored.
+    """
+
+    return _terms_path(path_output / TERMS_FOLDER, href).exists()
+
+
+def _terms_path(path_terms, href):
+    return path_terms / f"page_{hashlib.sha1(href.encode('utf-8')).hexdigest()[:16]}.json"
+
+
+def _shard_name(section, taken):
+    slug = _SLUG.sub('_', str(section).lower()).strip('_') or 'site'
+    name = f'{slug}.json.gz'
+    number = 1
+    while name in taken:
+        number += 1
+        name = f'{slug}_{number}.json.gz'
+    return name
@@ -0,0 +1,176 @@
+"""
+The section_cache module
+========================
+This module contains the SectionCache class which stores the rendered html of page sections, so sections that occur on many pages (such as a card with contact details or a collapsible with frequently asked questions) are only rendered once. The cache is shared between the pages of a build and between builds.
+
+The cache is content addressed: a section is stored under the hash of its function, argument and text, together with a hash of the code of the section processing functions. The names and hashes of the snippets a section used are stored with its html. A cached section is only used if these snippets are unchanged, so changing `snippet_card.html` only invalidates the sections that were rendered with it.
+
+The sections are stored as json files in the `sections` folder in the cache folder. Every process also keeps the sections it used last in memory. Using a cached section updates the modification time of its file, so the cache can be kept within its maximum size by removing the least recently used sections (see `evict`). The maximum size is set with `section_cache` in the BUILD section of `config.ini` (in MB, 0 switches the cache off).
+
+Sections are only cached if the output of their function depends on nothing but its input. To keep the output of `collapsible` stable, its ids are derived from its contents (see the section_processing module). As a result the same section gives the same ids wherever it occurs, so the PageBuilder replaces them with ids derived from the page id and the position of the section for every section it renders or takes from the cache (see `section_processing._set_ids`). This keeps the ids unique within a page, also when a section occurs on it more than once.
+
+    Objects in this module
+    ----------------------
+    - SectionCache (class)
+    - code_hash (function)
+"""
+
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from site_builder import outputs
+from site_builder import csv_sections
+from site_builder import section_processing
+
+
+CACHE_FOLDER = 'sections'
+MEMORY_ENTRIES = 1024  # Number of sections kept in memory per process
+
+
+class SectionCache:
+    """
+    The SectionCache class stores rendered sections on disk and in memory.
+
+    A SectionCache object is initialized with the following attributes:
+    ==============  ==================================================
+    Attribute       Description
+    ==============  ==================================================
+    path            Path to the folder of the cache
+    max_size        Maximum size of the cache in bytes
+    snippets        Hashes of the current snippets as dictionary
+    writer          WriteBehind that writes the sections or None
+    ==============  ==================================================
+
+    A SectionCache object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    get              Return a cached section.
+    put              Store a rendered section.
+    evict            Remove the least recently used sections.
+    ===============  =================================================
+    """
+
+    def __init__(self, path_cache, max_size, snippets=None, writer=None):
+        self.path = path_cache / CACHE_FOLDER
+        self.max_size = max_size
+        self.snippets = {name: _hash(source) for name, source in (snippets or dict()).items()}
+        self.code = code_hash()
+        self.memory = OrderedDict()
+        self.writer = writer
+
+    def get(self, function, arg, text):
+        """
+        Return the html of a cached section, if the snippets it was rendered with are unchanged.
+
+        -----
+        :param function: Name of the section function.
+        :param arg: Argument of the section function.
+        :param text: Text of the section.
+        :returns: Tuple of the html and the names of the used snippets, or None.
+        """
+
+        key = self._key(function, arg, text)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+        else:
+            path = self._path(key)
+            try:
+                entry = json.loads(path.read_text(encoding='utf-8'))
+                os.utime(path)
+            except (OSError, ValueError):
+                return None
+            self._remember(key, entry)
+        snippets = entry['snippets']
+        if any(self.snippets.get(name) != digest for name, digest in snippets.items()):
+            return None
+        return entry['html'], list(snippets)
+
+    def put(self, function, arg, text, html, snippets):
+        """
+        Store the html of a rendered section.
+
+        -----
+        :param function: Name of the section function.
+        :param arg: Argument of the section function.
+        :param text: Text of the section.
+        :param html: Rendered section as string.
+        :param snippets: Names of the snippets used by the section.
+        :returns: None
+        """
+
+        key = self._key(function, arg, text)
+        entry = dict(html=html,
+                     snippets={name: self.snippets.get(name) for name in sorted(snippets)})
+        self._remember(key, entry)
+        text = json.dumps(entry, ensure_ascii=False)
+        if self.writer is not None:
+            self.writer.submit(self._path(key), text)
+        else:
+            outputs.write_text(self._path(key), text)
+
+    def evict(self):
+        """
+        Remove the least recently used sections until the cache is within its maximum size.
+
+        -----
+        :returns: Number of removed sections.
+        """
+
+        if not self.path.exists():
+            return 0
+        files = list()
+        for folder in os.scandir(self.path):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        size = sum(file[1] for file in files)
+        removed = 0
+        for _, file_size, path in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            removed += 1
+        return removed
+
+    def _key(self, function, arg, text):
+        return _hash(json.dumps([self.code, function, arg, text], default=str))
+
+    def _path(self, key):
+        return self.path / key[:2] / f'{key}.json'
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        if len(self.memory) > MEMORY_ENTRIES:
+            self.memory.popitem(last=False)
+
+
+def code_hash():
+    """
+    Return the hash of the code of the section processing functions (the section_processing and csv_sections modules). Cached sections rendered by a different version of the code are not used.
+
+    -----
+    :returns: Hex digest as string.
+    """
+
+    digest = hashlib.sha1()
+    for module in [section_processing, csv_sections]:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
@@ -12,7 +12,7 @@ This module contains the functions needed for processing page sections. The gene
     [OUTPUT]
       output_html: Processed html output as string.
 
-The module loads all 'snippet_*.html' files from the defined template folder location as jinja2 templates. These templates are stored into a jinja2 environment (`SNIPPETS_ENV`) upon initialization and are available for any functions that need to use it.
+The module loads all 'snippet_*.html' files from the defined template folder location as jinja2 templates. These templates are stored into a jinja2 environment (`SNIPPETS_ENV`) by the build context (see `build.init_build`), or else when the first snippet is retrieved, and are available for any functions that need to use it.
 
 The PageBuilder class will automatically load all processing functions from this module into its dispatcher. To prevent helper functions from being loaded by the PageBuilder class, they are distinguished by prefixing an underscore '_' to their name.
 
@@ -32,19 +32,45 @@ The following functions are currently available:
     - markdown
 
     Helper functions:
+    - _read_table
     - _csv_to_df
     - _string_to_markdown
+    - _markdown
+    - _cell_markdown
+    - _load_snippets
+    - _get_snippet
+    - _set_ids
+
+The csv based sections (card, table and flextable) are read with the csv_sections module, which does not depend on pandas. Only csv that it cannot read in the same way as pandas is handed to pandas (see `_read_table`).
+
+Snippets are retrieved with `_get_snippet`, which records the names of the snippets in `used_snippets`. The PageBuilder uses this to keep track of the snippets each page depends on (see the manifest module).
 
 The keyword 'skip' is also reserved by the dispatcher and is used to pass the input of a section to the output unaltered.
+
+The ids of the elements rendered by the functions (such as the checkboxes of collapsible) are derived from their contents, so the output of a function only depends on its input. As a result a section that occurs twice on a page would give the same ids twice, so the PageBuilder replaces them with ids derived from the page id and the position of the section (see `_set_ids`).
+
+The markdown and jinja2 libraries are only imported when they are first needed, so importing this module is cheap.
+
+Markdown is rendered with a reusable `Markdown` instance per thread (see `_markdown`), because constructing a new instance and loading its extensions for every call is far more expensive than the conversion of a short text. Short strings, such as table cells and footer texts, are also memoized in an LRU cache.
 """
 
-import pandas as pd
-import uuid
-import markdown as md
-import jinja2
+import re
+import hashlib
+import threading
+from functools import lru_cache
 from collections import OrderedDict
 from io import StringIO
 from site_builder import config
+from site_builder import csv_sections
+
+
+MARKDOWN_EXTENSIONS = ['nl2br']
+MEMO_MAX_LENGTH = 500  # Strings up to this length are memoized by _cell_markdown
+ID_PATTERN = re.compile(r'(?<=collapsible-)[0-9a-f]{8}\b')  # Ids set by collapsible
+ID_PREFIX_PATTERN = re.compile(r'[^\w\-]+')  # Characters of a page id that are replaced in ids
+_local = threading.local()
+used_snippets = set()  # Names of the snippets retrieved by _get_snippet
+SNIPPETS_ENV = None  # Loaded by the build context or on first use
 
 
 def container(text, arg, process=True):
@@ -58,24 +84,24 @@ def container(text, arg, process=True):
     :param arg: Name of custom class as string.
     :returns: html-output as string.
     """
-    template = SNIPPETS_ENV.get_template('container')
+    template = _get_snippet('container')
 
     if '\n' in text and process == True:
-        text = md.markdown(text, extensions=['nl2br'])
+        text = _markdown(text)
     output_html = template.render(content=text, custom_class=arg)
     return output_html
 
 
 def collapsible(text):
     """
-    Separate section into subsections and render these as markdown into a collapsible container.
+    Separate section into subsections and render these as markdown into a collapsible container. The id of every collapsible is derived from its position and text, so rendering the same section twice gives the same output (see the section_cache module).
     |Uses 'collapsible' snippet.
 
     -----
     :param text: Text to be processed as string.
     :returns: html-output as string.
     """
-    template = SNIPPETS_ENV.get_template('collapsible')
+    template = _get_snippet('collapsible')
 
     collapsibles = list()
     for item in text.split('###')[1:]:
@@ -83,14 +109,14 @@ def collapsible(text):
         collapsibles.append((new_items))
 
     output_html = ''
-    for collapsible in collapsibles:
+    for idx, collapsible in enumerate(collapsibles):
         checked = None
         if ':' in collapsible[0]:
             label, checked = collapsible[0].split(':')
         else:
             label = collapsible[0]
-        code = str(uuid.uuid4())[:8]
-        content = md.markdown(collapsible[1], extensions=['nl2br'])
+        code = hashlib.sha1(f'{idx}\n{text}'.encode('utf-8')).hexdigest()[:8]
+        content = _markdown(collapsible[1])
 
         render = template.render(content=content,
                                  label=label,
@@ -110,7 +136,7 @@ def iframe(text, arg):
     :returns: html-output as string.
     """
 
-    template = SNIPPETS_ENV.get_template('iframe')
+    template = _get_snippet('iframe')
     output_html = template.render(iframe_code=text, nest=arg)
     return output_html
 
@@ -124,9 +150,9 @@ def card(text):
     :param text: Table as csv.
     :returns: html-output as string.
     """
-    df = _csv_to_df(text, header_row=None, header_names=['key', 'value'])
-    template = SNIPPETS_ENV.get_template('card')
-    content = OrderedDict(zip(df.key, df.value))
+    table = _read_table(text, header_row=None, header_names=['key', 'value'])
+    template = _get_snippet('card')
+    content = OrderedDict((key, value) for key, value in table.rows)
     output_html = template.render(content=content)
     return output_html
 
@@ -139,12 +165,18 @@ def table(text, arg):
     :param text: Table as csv.
     :returns: html-output as string.
     """
-    df = _csv_to_df(text)
-    with pd.option_context('display.max_colwidth', -1):
-        output_html = df.to_html(index=False,
-                                 na_rep='',
-                                 classes=arg,
-                                 escape=False)
+    try:
+        output_html = csv_sections.html_table(_read_table(text, fallback=False),
+                                              classes=arg)
+    except csv_sections.UnsupportedCsv:
+        import pandas as pd
+
+        df = _csv_to_df(text)
+        with pd.option_context('display.max_colwidth', -1):
+            output_html = df.to_html(index=False,
+                                     na_rep='',
+                                     classes=arg,
+                                     escape=False)
     output_html = container(output_html,
                             'table__container',
                             process=False)
@@ -159,16 +191,16 @@ def flextable(text):
     :param text: Table as csv.
     :returns: html-output as string.
     """
-    df = _csv_to_df(text)
-    number_of_cols = len(df.columns)
-    number_of_rows = len(df.index)
+    table = _read_table(text)
+    number_of_cols = len(table.columns)
+    number_of_rows = len(table.rows)
 
-    flextable_header = ''
-    for column in df.columns:
-        flextable_header += f'<div class="flextable__header">{column.strip()}</div>\n'
+    output = list()
+    output.append(f'<div class="flextable" style="grid-template-columns: repeat({number_of_cols}, auto)">\n')
+    for column in table.columns:
+        output.append(f'<div class="flextable__header">{column.strip()}</div>\n')
 
-    flextable_body = ''
-    for row_idx, *items in df.itertuples():
+    for row_idx, items in enumerate(table.rows):
         for col_idx, item in enumerate(items):
             # Add css class to end of row / end of last row.
             if col_idx + 1 == number_of_cols:
@@ -183,15 +215,15 @@ def flextable(text):
                 category = ''
                 css_class = ' remove_padding'
             else:
-                category = f'\t<div class="flextable__category">{df.columns[col_idx]}</div>\n'
+                category = f'\t<div class="flextable__category">{table.columns[col_idx]}</div>\n'
             # Build up flextable body.
-            flextable_body += (f'<div class="flextable__item{css_class}">\n'
-                               f'{category}'
-                               f'\t<div>{item}</div>\n'
-                               f'</div>\n')
+            output.append(f'<div class="flextable__item{css_class}">\n'
+                          f'{category}'
+                          f'\t<div>{item}</div>\n'
+                          f'</div>\n')
 
-    flextable = flextable_header + flextable_body
-    output_html = f'<div class="flextable" style="grid-template-columns: repeat({number_of_cols}, auto)">\n{flextable}\n</div>\n'
+    output.append('\n</div>\n')
+    output_html = ''.join(output)
     return output_html
 
 
@@ -203,10 +235,32 @@ def markdown(text):
     :param text: Markdown to be processed as string.
     :returns: html-output as string.
     """
-    output_html = md.markdown(text, extensions=['nl2br'])
+    output_html = _markdown(text)
     return output_html
 
 
+def _read_table(text, header_row=0, header_names=None, fallback=True):
+    """
+    Read csv into a CsvTable with the csv_sections engine and apply markdown to cells if applicable. If the engine does not support the csv, fall back on reading it with pandas.
+
+    -----
+    :param text: Table as csv.
+    :param header_row: 0 if the first row contains the column names, None if it does not.
+    :param header_names: Column names to use if there is no header row.
+    :param fallback: If False, raise UnsupportedCsv instead of falling back on pandas.
+    :returns: Table as CsvTable.
+    """
+    try:
+        table = csv_sections.read_csv(text, header_row, header_names)
+    except csv_sections.UnsupportedCsv:
+        if not fallback:
+            raise
+        df = _csv_to_df(text, header_row, header_names)
+        return csv_sections.CsvTable(list(df.columns), df.values.tolist())
+    rows = [[_string_to_markdown(item) for item in row] for row in table.rows]
+    return csv_sections.CsvTable(table.columns, rows)
+
+
 def _csv_to_df(text, header_row=0, header_names=None):
     """
     Converts csv to dataframe and applies markdown to cells if applicable.
@@ -215,6 +269,8 @@ def _csv_to_df(text, header_row=0, header_names=None):
     :param text_input: Table as csv.
     :returns: Table as DataFrame.
     """
+    import pandas as pd
+
     df = pd.read_csv(StringIO(text), skipinitialspace=True,
                      quotechar="'", header=header_row, names=header_names)
     return df.applymap(_string_to_markdown)
@@ -233,14 +289,96 @@ def _string_to_markdown(string):
     if not string == string:
         string = ''
     string = str(string)
-    if not any(symbol in char for char in string for symbol in symbols):
+    if not any(symbol in string for symbol in symbols):
         return string
-    return md.markdown(string, extensions=['nl2br']).replace('\n', '')
+    if len(string) <= MEMO_MAX_LENGTH:
+        return _cell_markdown(string)
+    return _markdown(string).replace('\n', '')
+
+
+@lru_cache(maxsize=4096)
+def _cell_markdown(string):
+    """
+    Memoized version of rendering a (short) string as markdown with newlines removed.
+
+    -----
+    :param string: String to be processed.
+    :returns: rendered html as string.
+    """
+    return _markdown(string).replace('\n', '')
+
+
+def _markdown(text):
+    """
+    Render markdown with the Markdown instance of the current thread. The instance is created on first use and reset before every conversion, which gives the same output as `markdown.markdown` without reloading the extensions.
 
+    -----
+    :param text: Markdown to be processed as string.
+    :returns: html-output as string.
+    """
+    converter = getattr(_local, 'markdown', None)
+    if converter is None:
+        import markdown as md
+        converter = _local.markdown = md.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return converter.reset().convert(text)
+
+
+def _get_snippet(name):
+    """
+    Return a snippet template from SNIPPETS_ENV and record its name in `used_snippets`. The snippets are loaded if this has not been done yet.
+
+    -----
+    :param name: Name of the snippet (without the 'snippet_' prefix).
+    :returns: jinja2 template.
+    """
+    global SNIPPETS_ENV
+    if SNIPPETS_ENV is None:
+        SNIPPETS_ENV = _load_snippets()
+    used_snippets.add(name)
+    return SNIPPETS_ENV.get_template(name)
+
+
+def _set_ids(html, page_id, position):
+    """
+    Replace the ids within a rendered section (see `ID_PATTERN`) with ids derived from the page id, the position of the section and the order of the ids within the section. The ids are unique within the page, also if a section occurs more than once, and do not change between builds.
+
+    -----
+    :param html: Rendered section as string.
+    :param page_id: Id of the page.
+    :param position: Position of the section within the page.
+    :returns: html with the replaced ids.
+    """
+    if 'collapsible-' not in html:
+        return html
+    prefix = ID_PREFIX_PATTERN.sub('_', str(page_id))
+    ids = dict()
+
+    def replace(match):
+        number = ids.setdefault(match.group(0), len(ids))
+        return f'{prefix}-{position}-{number}'
+
+    return ID_PATTERN.sub(replace, html)
+
+
+def _load_snippets(snippets=None):
+    """
+    Load the snippet templates from the project templates folder in a jinja2 environment. The compiled snippets are stored in a bytecode cache in the cache folder, so they are only compiled again if their source changed.
+
+    -----
+    :param snippets: Optional dictionary of snippet names and sources to use instead of the templates folder.
+    :returns: Snippets as jinja2 environment.
+    """
+    import jinja2
+
+    if snippets is None:
+        snippets = dict()
+        for snippet_file in config.PATH_CONFIG['templates'].glob('**/snippet_*.html'):
+            name = snippet_file.stem[8:]
+            template = snippet_file.read_text(encoding='utf-8')
+            snippets[name] = template
+    path_cache = config.PATH_CONFIG['cache'] / 'jinja2'
+    path_cache.mkdir(parents=True, exist_ok=True)
+    bytecode_cache = jinja2.FileSystemBytecodeCache(str(path_cache), '__snippet_%s.cache')
+    return jinja2.Environment(loader=jinja2.DictLoader(snippets),
+                              bytecode_cache=bytecode_cache)
 
-snippets = dict()
-for snippet_file in config.PATH_CONFIG['templates'].glob('**/snippet_*.html'):
-    name = snippet_file.stem[8:]
-    template = snippet_file.read_text(encoding='utf-8')
-    snippets[name] = template
-SNIPPETS_ENV = jinja2.Environment(loader=jinja2.DictLoader(snippets))
@@ -7,21 +7,38 @@ This module contains:
     - Version
     - Language
     - Footer data
-- The SiteStructure class stores the organizational structure of the site to be built. It defines the order of the sections, chapters, groups and pages. This data is mainly used to generate the navigational elements of the html. Usually, a site structure is instantiated from an excel file using the read_excel function also contained in this module.
+- The SiteStructure class stores the organizational structure of the site to be built. It defines the order of the sections, chapters, groups and pages. This data is mainly used to generate the navigational elements of the html. Usually, a site structure is instantiated from a structure file in the content folder using the load_structure function also contained in this module.
+
+The structure file is set with `structure_file` in the BUILD section of `config.ini` (default: `structure.xlsx`). Apart from excel files, the structure can also be read from csv, json and toml files with the same columns (see `read_csv`, `read_json` and `read_toml`). Reading excel files is slow, so the parsed structure of an excel file is cached in the cache folder. The cache is used as long as the modification time and size (or else the hash) of the excel file are unchanged.
 
     Objects in this module
     ----------------------
     - SiteProperties (class)
     - SiteStructue (class)
+    - PageRecord (class)
+    - PageNavigation (class)
+    - Adjacent (class)
+    - load_structure (function)
     - read_excel (function)
+    - read_csv (function)
+    - read_json (function)
+    - read_toml (function)
+    - structure_from_rows (function)
+    - pages_from_rows (function)
     - convert_to_href (function)
+    - CROSSREF_PATTERN (constant)
 
 Upon initialization this module reads the properties file in the specified content folder and creates an instance of the SiteProperties class as 'properties'.
 """
 
+import re
+import csv
+import json
+import pickle
+import hashlib
 import configparser
-import pandas as pd
 from collections import OrderedDict
+from collections import namedtuple
 from site_builder import section_processing
 from site_builder import config
 
@@ -112,6 +129,90 @@ class SiteProperties:
         return ini
 
 
+STRUCTURE_COLUMNS = [
+    'Section_order',
+    'Section',
+    'Chapter_order',
+    'Chapter',
+    'Group_order',
+    'Group',
+    'Page_order',
+    'Page',
+    'Code',
+    ]
+STRUCTURE_CACHE_VERSION = 1
+CROSSREF_PATTERN = re.compile(r'\[([^\[\]\n]+)\]')
+
+
+class PageRecord:
+    """
+    The PageRecord class stores a single row of the SiteStructure: the page id, the columns of the structure file and the Href and Href_nest of the page. Empty cells are stored as None.
+
+    The columns can be retrieved as attributes (`record.Href`) or by indexing the record with the column name (`record['Href']`).
+    """
+
+    __slots__ = ['Page_id'] + STRUCTURE_COLUMNS + ['Href', 'Href_nest']
+
+    def __init__(self, **values):
+        for column in self.__slots__:
+            setattr(self, column, values.get(column))
+
+    def __getitem__(self, column):
+        try:
+            return getattr(self, column)
+        except AttributeError:
+            raise KeyError(column) from None
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __repr__(self):
+        return f'PageRecord({self.to_dict()!r})'
+
+    def to_dict(self):
+        """
+        Return the record as dictionary.
+
+        -----
+        :returns: Columns and their values as dictionary.
+        """
+        return {column: getattr(self, column) for column in self.__slots__}
+
+
+PageNavigation = namedtuple('PageNavigation', ['page',
+                                               'section',
+                                               'chapter',
+                                               'breadcrumbs',
+                                               'nest',
+                                               'adjacent',
+                                               'sitemap'])
+PageNavigation.__doc__ = """
+Navigational data of a single page as stored in the navigation index of the SiteStructure:
+==============  ==================================================
+Field           Description
+==============  ==================================================
+page            Page name
+section         Section name
+chapter         Chapter name
+breadcrumbs     Breadcrumb representation of the page
+nest            Relative path from the page to the site root
+adjacent        Previous and next page as Adjacent
+sitemap         Sitemap of the section the page belongs to
+==============  ==================================================
+"""
+
+Adjacent = namedtuple('Adjacent', ['prev_page',
+                                   'prev_href',
+                                   'next_page',
+                                   'next_href'])
+Adjacent.__doc__ = """
+Name and href of the previous and next page.
+"""
+
+
 class SiteStructure:
     """
     The SiteStructure class contains the structure for the site. It determines the hierarchy and order of the site pages. During site construction the SiteStructure is used to generate the navigational elements of the html. A SitesStructure has the following hierarchy:
@@ -122,7 +223,7 @@ class SiteStructure:
     > > > > Groups
     > > > > > Pages
 
-    At its core the SiteStructure consists of a DataFrame with the following  columns:
+    At its core the SiteStructure consists of a list of PageRecords with the following columns:
     ==============  ========================================
     Column name     Description
     ==============  ========================================
@@ -138,99 +239,105 @@ class SiteStructure:
     Href            Href of the page
     Href_nest       Nest level of the page
     ==============  ========================================
-    Each row represents a page on the site and is indexed by its page id.    The underlying df is directly accessible through the `df_site` attribute. Site pages can be retrieved through the class index. The indexing method accepts either page ids or integers and returns the page information as a pandas Series.
+    Each record represents a page on the site and is indexed by its page id. Site pages can be retrieved through the class index. The indexing method accepts either page ids or integers and returns the PageRecord of the page. For compatibility the records are also available as a DataFrame through the `df_site` attribute, which is only created (and pandas only imported) when it is accessed.
 
     A SiteStructure object has the following attributes and methods:
     ==============  ==================================================
     Attribute       Description
     ==============  ==================================================
+    pages           Site structure as list of PageRecords
     df_site         Site structure as DataFrame
     page_ids        Page_ids as list
     sections        Sections as list
     href_sections   Section names with their href as list of tuples
     href_pages      Pages with their hrefs as list of tuples
     crossrefs       Crossref codes with their hrefs as list of tuples
+    crossref_hrefs  Crossref codes with their hrefs as dictionary
     ==============  ==================================================
 
     ===============  =================================================
     Method           Description
     ===============  =================================================
+    navigation       Return the PageNavigation from page id.
     sitemap          Return the sitemap as a nested dictionary.
     adjacent pages   Return previous and next name/href from page id.
+    breadcrumbs      Return the breadcrumbs from page id.
     ===============  =================================================
 
+    The sitemap and the navigational data of every page are computed once upon instantiation and stored in a navigation index, so rendering a page only requires a lookup. The objects in the navigation index are shared between pages and should be treated as read-only.
+
     The class also contains the following static methods which are used during class instantiation:
     =====================  ======================================
     Static method          Description
     =====================  ======================================
-    _find_hrefs_sections   Return hrefs_sections from DataFrame.
-    _find_hrefs_pages      Return hrefs_pages from DataFrame.
-    _find_crossrefs        Return crossrefs from DataFrame.
+    _find_hrefs_sections   Return hrefs_sections from PageRecords.
+    _find_hrefs_pages      Return hrefs_pages from PageRecords.
+    _find_crossrefs        Return crossrefs from PageRecords.
+    _find_sitemap          Return sitemap from PageRecords.
     =====================  ======================================
     """
 
-    def __init__(self, df_site):
-        self.df_site = df_site
-        self.page_ids = self.df_site.index.values
-        self.sections = self.df_site.Section.unique().tolist()
-        self.href_sections = self._find_hrefs_sections(self.df_site)
-        self.href_pages = self._find_hrefs_pages(self.df_site)
-        self.crossrefs = self._find_crossrefs(self.df_site)
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self._index = {page.Page_id: page for page in self.pages}
+        self._df_site = None
+        self.page_ids = list(self._index)
+        self.sections = list(OrderedDict.fromkeys(page.Section for page in self.pages))
+        self.href_sections = self._find_hrefs_sections(self.pages)
+        self.href_pages = self._find_hrefs_pages(self.pages)
+        self.crossrefs = self._find_crossrefs(self.pages)
+        self.crossref_hrefs = {str(code): href for code, href in self.crossrefs}
+        self._sitemap = self._find_sitemap(self.pages)
+        self._navigation = self._build_navigation()
 
     def __getitem__(self, page_id):
         if isinstance(page_id, str):
-            return self.df_site.loc[page_id]
+            return self._index[page_id]
         elif isinstance(page_id, int):
-            return self.df_site.iloc[page_id]
+            return self.pages[page_id]
 
     def __len__(self):
-        return len(self.df_site)
+        return len(self.pages)
+
+    @property
+    def df_site(self):
+        """
+        Site structure as DataFrame indexed by page id (created on first access).
+        """
+
+        if self._df_site is None:
+            import pandas as pd
+            columns = STRUCTURE_COLUMNS + ['Href', 'Href_nest']
+            data = [[page[column] for column in columns] for page in self.pages]
+            index = pd.Index(self.page_ids, name='Page_id')
+            self._df_site = pd.DataFrame(data, index=index, columns=columns)
+        return self._df_site
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_df_site'] = None
+        return state
+
+    def navigation(self, page_id):
+        """
+        Return the navigational data of a page from the navigation index.
+
+        -----
+        :param page_id: id of the page.
+        :returns: PageNavigation of the page.
+        """
+
+        return self._navigation[page_id]
 
     def sitemap(self):
         """
-        Create sitemap as nested ordered dictionaries from site structure.
+        Return sitemap as nested ordered dictionaries from site structure.
 
         -----
         :returns: sitemap as nested OrderedDict.
         """
 
-        def serie_to_df(df):
-            if isinstance(df, pd.Series):
-                return df.to_frame().T
-            else:
-                return df
-
-        df = (self.df_site[['Section', 'Chapter', 'Group', 'Page', 'Href']]
-                  .fillna({'Chapter': self.df_site.Chapter_order,
-                           'Group': self.df_site.Group_order}))
-
-        dct_sitemap = OrderedDict()
-        for section in df.Section.unique():
-            dct_section = OrderedDict()
-            df_section = serie_to_df(df.set_index('Section')
-                                       .xs(section))
-            for chapter in df_section.Chapter.unique():
-                dct_chapter = OrderedDict()
-                df_chapter = serie_to_df(df_section.set_index('Chapter')
-                                                   .xs(chapter))
-                for group in df_chapter.Group.unique():
-
-                    pages = df_chapter.set_index('Group').loc[group].Page
-                    hrefs = df_chapter.set_index('Group').loc[group].Href
-
-                    if isinstance(pages, str):
-                        pages = [pages]
-                        hrefs = [hrefs]
-                    else:
-                        pages = pages.values
-                        hrefs = hrefs.values
-
-                    page_href = list(zip(pages, hrefs))
-                    dct_chapter[group] = page_href
-                    dct_section[chapter] = dct_chapter
-                    dct_sitemap[section] = dct_section
-
-        return dct_sitemap
+        return self._sitemap
 
     def adjacent_pages(self, page_id):
         """
@@ -243,24 +350,7 @@ class SiteStructure:
         :returns: Name and href of previous and next page as dictionary.
         """
 
-        idx_current = list(self.href_pages.keys()).index(page_id)
-
-        prev_id = list(self.href_pages.keys())[idx_current - 1]
-        prev_page = self.href_pages[prev_id][0]
-        prev_href = self.href_pages[prev_id][1]
-
-        try:
-            next_id = list(self.href_pages.keys())[idx_current + 1]
-        except IndexError:
-            next_id = list(self.href_pages.keys())[0]
-        finally:
-            next_page = self.href_pages[next_id][0]
-            next_href = self.href_pages[next_id][1]
-
-        return dict(prev_page=prev_page,
-                    prev_href=prev_href,
-                    next_page=next_page,
-                    next_href=next_href)
+        return dict(self._navigation[page_id].adjacent._asdict())
 
     def breadcrumbs(self, page_id):
         """
@@ -275,75 +365,117 @@ class SiteStructure:
         :returns: Breadcrumb representation of the page as string.
         """
 
-        section = self[page_id]['Section']
-        chapter = self[page_id]['Chapter']
-        group = self[page_id]['Group']
-        page_name = self[page_id]['Page']
+        return self._navigation[page_id].breadcrumbs
 
-        page_items = [section, chapter, group, page_name]
-        page_items = [item for item in page_items if isinstance(item, str)]
-        if len(set(page_items)) == 1:
-            page_items = [page_items[0]]
+    def _build_navigation(self):
+        """
+        Build the navigation index: a dictionary of PageNavigation tuples indexed by page id.
+
+        -----
+        :returns: Navigation index as dictionary.
+        """
 
-        return ' | '.join(page_items)
+        page_ids = list(self.href_pages.keys())
+        navigation = dict()
+        for idx, page_id in enumerate(page_ids):
+            prev_page, prev_href = self.href_pages[page_ids[idx - 1]]
+            next_id = page_ids[(idx + 1) % len(page_ids)]
+            next_page, next_href = self.href_pages[next_id]
+            adjacent = Adjacent(prev_page, prev_href, next_page, next_href)
+
+            page = self[page_id]
+            page_items = [page['Section'], page['Chapter'], page['Group'], page['Page']]
+            page_items = [item for item in page_items if isinstance(item, str)]
+            if len(set(page_items)) == 1:
+                page_items = [page_items[0]]
+
+            navigation[page_id] = PageNavigation(
+                page=page['Page'],
+                section=page['Section'],
+                chapter=page['Chapter'],
+                breadcrumbs=' | '.join(page_items),
+                nest='../' * page['Href_nest'],
+                adjacent=adjacent,
+                sitemap=self._sitemap[page['Section']],
+                )
+        return navigation
 
     @staticmethod
-    def _find_hrefs_sections(df_site):
+    def _find_hrefs_sections(pages):
         """
-        Create a list of tuples, associating a section with the href of the first page of that section.
+        Create a list of tuples, associating a section with the href of the first page of that section. The sections are sorted by their order and name.
 
         -----
-        :param df_site: The site structure dataframe
+        :param pages: The site structure as list of PageRecords.
         :returns: A list of tuples containing section name and href of its
         associated page.
         """
 
-        df = (df_site.loc[:, ['Section_order', 'Section', 'Href']]
-                     .groupby(['Section_order', 'Section'])
-                     .first())
-        df.index = df.index.droplevel()
-        return list(zip(df.index, df.Href.values))
+        hrefs_sections = dict()
+        for page in pages:
+            if page.Section_order is None or page.Section is None:
+                continue
+            hrefs_sections.setdefault((page.Section_order, page.Section), page.Href)
+        return [(section, hrefs_sections[order, section])
+                for order, section in sorted(hrefs_sections)]
 
     @staticmethod
-    def _find_hrefs_pages(df_site):
+    def _find_hrefs_pages(pages):
         """
         Helper function for creating a list of page id, href tuples.
 
         -----
-        :param df_site: The site structure dataframe
+        :param pages: The site structure as list of PageRecords.
         :returns: A list of tuples containing the page id and its href.
         """
 
         href_pages = OrderedDict()
-        for page_id, page, href in list(zip(df_site.index.values,
-                                            df_site.Page.values,
-                                            df_site.Href.values)):
-            href_pages[page_id] = (page, href)
+        for page in pages:
+            href_pages[page.Page_id] = (page.Page, page.Href)
         return href_pages
 
     @staticmethod
-    def _find_crossrefs(df_site):
+    def _find_crossrefs(pages):
         """
         Helper function for creating a list of crossreference code, href tuples.
 
         -----
-        :param df_site: The site structure dataframe
+        :param pages: The site structure as list of PageRecords.
         :returns: List of tuples containing the crossreference code and its
         href.
         """
 
-        df = df_site.loc[df_site.Code.isna() == False]
-        return list(zip(df.Code.values, df.Href.values))
+        return [(page.Code, page.Href) for page in pages if page.Code is not None]
+
+    @staticmethod
+    def _find_sitemap(pages):
+        """
+        Create sitemap as nested ordered dictionaries from site structure:
+
+            section > chapter > group > [(page, href), ...]
+
+        Chapters and groups without a name are identified by their order.
+
+        -----
+        :param pages: The site structure as list of PageRecords.
+        :returns: sitemap as nested OrderedDict.
+        """
+
+        sitemap = OrderedDict()
+        for page in pages:
+            chapter = page.Chapter if page.Chapter is not None else page.Chapter_order
+            group = page.Group if page.Group is not None else page.Group_order
+            dct_section = sitemap.setdefault(page.Section, OrderedDict())
+            dct_chapter = dct_section.setdefault(chapter, OrderedDict())
+            dct_chapter.setdefault(group, list()).append((page.Page, page.Href))
+        return sitemap
 
 
 def read_excel(path_to_structure_file):
     """
     Helper function for creating a SiteStructure object from an excel file.
     - Read excel file into a dataframe.
-    - Sort data according to the 'order' columns.
-    - Add href and nest level to each page.
-    - Set divergent href and nest level for home.
-    - Create a SiteStructure instance and return it.
+    - Create a SiteStructure instance from its rows with `structure_from_rows` and return it.
 
     The excel file has to contain the following columns:
     ==============  =======================================
@@ -375,18 +507,188 @@ def read_excel(path_to_structure_file):
     :returns: Instance of the SiteStructure class.
     """
 
+    return structure_from_rows(_excel_rows(path_to_structure_file))
+
+
+def read_csv(path_to_structure_file):
+    """
+    Helper function for creating a SiteStructure object from a csv file. The csv file has the same columns as the excel file (see `read_excel`), the first column contains the page id. Empty cells are read as None and the values in the order columns are converted to numbers.
+
+    -----
+    :param path_to_structure_file: Path to the csv file containing the site structure.
+    :returns: Instance of the SiteStructure class.
+    """
+
+    with open(path_to_structure_file, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        header[0] = 'Page_id'
+        rows = [dict(zip(header, row)) for row in reader if row]
+
+    for row in rows:
+        for column, value in row.items():
+            if value == '':
+                row[column] = None
+            elif column.endswith('_order'):
+                row[column] = float(value) if '.' in value else int(value)
+    return structure_from_rows(rows)
+
+
+def read_json(path_to_structure_file):
+    """
+    Helper function for creating a SiteStructure object from a json file. The json file contains either a list of rows (objects with a 'Page_id' and the columns listed in `read_excel`) or an object mapping the page ids to their rows. Missing columns are read as None.
+
+    -----
+    :param path_to_structure_file: Path to the json file containing the site structure.
+    :returns: Instance of the SiteStructure class.
+    """
+
+    with open(path_to_structure_file, encoding='utf-8') as f:
+        data = json.load(f)
+    return structure_from_rows(_records(data))
+
+
+def read_toml(path_to_structure_file):
+    """
+    Helper function for creating a SiteStructure object from a toml file. The toml file contains a table for every page, named after the page id, or an array of tables named 'pages' (each with a 'Page_id'). Since toml has no null value, empty cells are left out.
+
+    Example:
+        [p0001]
+        Section_order = 1
+        Section = "Home"
+        ...
+
+    -----
+    :param path_to_structure_file: Path to the toml file containing the site structure.
+    :returns: Instance of the SiteStructure class.
+    """
+
+    import tomllib
+
+    with open(path_to_structure_file, 'rb') as f:
+        data = tomllib.load(f)
+    return structure_from_rows(_records(data))
+
+
+def load_structure(path_to_structure_file, path_cache=None):
+    """
+    Create a SiteStructure object from a structure file. The reader is selected by the extension of the file (xlsx, csv, json or toml).
+
+    The sorted pages read from an excel file are pickled in the cache folder, together with the modification time, size and hash of the excel file. As long as the excel file does not change, the structure is loaded from the cache, which skips the excel engine altogether.
+
+    -----
+    :param path_to_structure_file: Path to the structure file.
+    :param path_cache: Path to the cache folder (defaults to the cache folder in `config.ini`).
+    :returns: Instance of the SiteStructure class.
+    """
+
+    suffix = path_to_structure_file.suffix.lower()
+    if suffix == '.csv':
+        return read_csv(path_to_structure_file)
+    elif suffix == '.json':
+        return read_json(path_to_structure_file)
+    elif suffix == '.toml':
+        return read_toml(path_to_structure_file)
+    elif suffix not in ('.xlsx', '.xls'):
+        raise ValueError(f'Unsupported structure file: {path_to_structure_file}')
+
+    if path_cache is None:
+        path_cache = config.PATH_CONFIG['cache']
+    path_cached = path_cache / 'structure.pickle'
+    stat = path_to_structure_file.stat()
+    source = dict(path=str(path_to_structure_file.resolve()),
+                  mtime=stat.st_mtime_ns,
+                  size=stat.st_size)
+
+    cached = None
+    if path_cached.exists():
+        try:
+            with open(path_cached, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            cached = None
+
+    digest = None
+    if cached is not None and cached['version'] == STRUCTURE_CACHE_VERSION:
+        if all(cached[key] == value for key, value in source.items()):
+            return SiteStructure(cached['pages'])
+        digest = hashlib.sha1(path_to_structure_file.read_bytes()).hexdigest()
+        if cached['path'] == source['path'] and cached['digest'] == digest:
+            pages = cached['pages']
+            _write_cache(path_cached, source, digest, pages)
+            return SiteStructure(pages)
+
+    if digest is None:
+        digest = hashlib.sha1(path_to_structure_file.read_bytes()).hexdigest()
+    pages = pages_from_rows(_excel_rows(path_to_structure_file))
+    _write_cache(path_cached, source, digest, pages)
+    return SiteStructure(pages)
+
+
+def structure_from_rows(rows):
+    """
+    Create a SiteStructure object from rows of the structure table (see `pages_from_rows`).
+
+    -----
+    :param rows: Rows of the structure table as dictionaries containing the page id ('Page_id') and the columns listed in `read_excel`.
+    :returns: Instance of the SiteStructure class.
+    """
+
+    return SiteStructure(pages_from_rows(rows))
+
+
+def pages_from_rows(rows):
+    """
+    Create the PageRecords of a SiteStructure from rows of the structure table.
+    - Convert empty (NaN) cells to None.
+    - Sort rows according to the 'order' columns.
+    - Add href and nest level to each page.
+    - Set divergent href and nest level for home.
+
+    -----
+    :param rows: Rows of the structure table as dictionaries containing the page id ('Page_id') and the columns listed in `read_excel`.
+    :returns: Sorted list of PageRecords.
+    """
+
+    pages = list()
+    for row in rows:
+        values = {column: (value if value == value else None)
+                  for column, value in row.items()}
+        page = PageRecord(**values)
+        page.Href = convert_to_href(page.Section, page.Chapter, page.Page)
+        page.Href_nest = (page.Section is not None) + (page.Chapter is not None)
+        pages.append(page)
+
+    order_columns = [column for column in STRUCTURE_COLUMNS if '_order' in column]
+    pages.sort(key=lambda page: [(page[column] is None, page[column] or 0)
+                                 for column in order_columns])
+    if pages:
+        pages[0].Href = 'index.html'
+        pages[0].Href_nest = 0
+    return pages
+
+
+def _excel_rows(path_to_structure_file):
+    import pandas as pd
+
     df = pd.read_excel(path_to_structure_file, index_col=0)
+    df.index.name = 'Page_id'
+    return df.reset_index().to_dict('records')
+
+
+def _records(data):
+    if isinstance(data, dict) and isinstance(data.get('pages'), list):
+        data = data['pages']
+    if isinstance(data, dict):
+        return [dict(row, Page_id=page_id) for page_id, row in data.items()]
+    return list(data)
+
 
-    df.sort_values(by=[col for col in df.columns if '_order' in col],
-                   inplace=True)
-    df['Href'] = df.apply(lambda row: convert_to_href(row.Section,
-                                                      row.Chapter,
-                                                      row.Page), axis=1)
-    df['Href_nest'] = df.apply(lambda row: (not pd.isna(row.Section)) +
-                                           (not pd.isna(row.Chapter)), axis=1)
-    df.loc[df.index[0], 'Href'] = 'index.html'
-    df.loc[df.index[0], 'Href_nest'] = 0
-    return SiteStructure(df)
+def _write_cache(path_cached, source, digest, pages):
+    path_cached.parent.mkdir(parents=True, exist_ok=True)
+    cached = dict(source, version=STRUCTURE_CACHE_VERSION, digest=digest, pages=pages)
+    with open(path_cached, 'wb') as f:
+        pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
 
 
 def convert_to_href(*args):
@@ -0,0 +1,205 @@
+"""
+The stylesheets module
+======================
+This module contains the StylesheetPipeline class which decides which stylesheets are linked by a page and writes them to the css folder of the output folder. Every page links the base stylesheet (`styles_base.css` combined with `styles_custom_formatting.css`) and the stylesheets of the section functions it uses (such as `styles_table.css`). Only the stylesheets that are used by at least one page are written.
+
+The stylesheets are written according to the stylesheet mode, which is set with `stylesheets` in the BUILD section of `config.ini` (or with the 'stylesheets' flag of the build site script):
+
+========  =====================================================================
+Mode      Description
+========  =====================================================================
+plain     Every stylesheet is written under its own name (e.g. `styles_table.css`). This is the default.
+hashed    Every stylesheet is written with the hash of its contents in the name (e.g. `styles_table.3f2a9c01d4.css`).
+bundled   The stylesheets of a page are combined into a single minified bundle, named after the hash of its contents (e.g. `bundle.9be1c4f0a2.css`). Pages using the same stylesheets share a bundle.
+========  =====================================================================
+
+Since the names of hashed stylesheets and bundles change whenever their contents change, they can be cached by the browser indefinitely. Stylesheets written by the pipeline that are no longer used are removed from the css folder. The names of the written stylesheets are recorded in `.stylesheets.json` in the css folder, so other files in the css folder (such as stylesheets put there by hand) are left alone. Hashed stylesheets and bundles are recognized by their names as well.
+
+The names are derived from the sources of the stylesheets, so they are known when a page is rendered, before the stylesheets are written.
+
+    Objects in this module
+    ----------------------
+    - StylesheetPipeline (class)
+    - minify_css (function)
+    - STYLESHEET_MODES (constant)
+"""
+
+import re
+import json
+import hashlib
+
+
+STYLESHEET_MODES = ['plain', 'hashed', 'bundled']
+BASE_STYLESHEET = 'styles_base.css'
+CUSTOM_STYLESHEET = 'styles_custom_formatting.css'
+HASH_LENGTH = 10
+RECORD = '.stylesheets.json'  # Names of the stylesheets written by the pipeline
+
+_TOKEN = re.compile(r'/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', re.DOTALL)
+_WHITESPACE = re.compile(r'\s+')
+_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+_COLON = re.compile(r':\s+')
+_GENERATED = re.compile(rf'(styles_.+|bundle)\.[0-9a-f]{{{HASH_LENGTH}}}\.css')
+
+
+class StylesheetPipeline:
+    """
+    The StylesheetPipeline class returns the stylesheets linked by a page and writes the stylesheets used by the pages to the output folder.
+
+    A StylesheetPipeline object is initialized with the following attributes:
+    ==============  ==================================================
+    Attribute       Description
+    ==============  ==================================================
+    mode            Stylesheet mode (one of STYLESHEET_MODES)
+    sources         Contents of the stylesheets as dictionary
+    hashes          Hashes of the contents of the stylesheets
+    ==============  ==================================================
+
+    A StylesheetPipeline object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    links            Return the names of the stylesheets a page links.
+    outputs          Return the contents of the stylesheets to write.
+    write            Write the stylesheets to the css folder.
+    ===============  =================================================
+    """
+
+    def __init__(self, path_templates, mode='plain'):
+        if mode not in STYLESHEET_MODES:
+            raise ValueError(f'Unknown stylesheet mode {mode!r}, choose from {STYLESHEET_MODES}.')
+        self.mode = mode
+        self.sources = dict()
+        for path in sorted(path_templates.glob('styles_*.css')):
+            if path.name != CUSTOM_STYLESHEET:
+                self.sources[path.name] = path.read_text()
+        custom = path_templates / CUSTOM_STYLESHEET
+        if custom.exists():
+            self.sources[BASE_STYLESHEET] = self.sources.get(BASE_STYLESHEET, '') + custom.read_text()
+        self.hashes = {name: _hash(source) for name, source in self.sources.items()}
+
+    def links(self, stylesheets):
+        """
+        Return the names of the stylesheets that a page with the given stylesheets links, relative to the css folder. The base stylesheet is always linked first.
+
+        -----
+        :param stylesheets: Names of the stylesheets used by the page (e.g. ['styles_table.css']).
+        :returns: Names of the stylesheets to link as list.
+        """
+
+        names = self._names(stylesheets)
+        if self.mode == 'bundled':
+            return [self._bundle_name(names)]
+        if self.mode == 'hashed':
+            return [self._hashed_name(name) for name in names]
+        return names
+
+    def outputs(self, stylesheet_sets):
+        """
+        Return the stylesheets that need to be written for the given sets of stylesheets.
+
+        -----
+        :param stylesheet_sets: Stylesheets used per page as iterable of lists.
+        :returns: Dictionary of output names and contents.
+        """
+
+        outputs = dict()
+        for stylesheets in stylesheet_sets:
+            names = self._names(stylesheets)
+            if self.mode == 'bundled':
+                bundle = self._bundle_name(names)
+                if bundle not in outputs:
+                    names = names[:1] + sorted(names[1:])
+                    outputs[bundle] = minify_css(''.join(self.sources[name] for name in names))
+                continue
+            for name in names:
+                output_name = self._hashed_name(name) if self.mode == 'hashed' else name
+                outputs[output_name] = self.sources[name]
+        return outputs
+
+    def write(self, path_output, stylesheet_sets):
+        """
+        Write the stylesheets used by the pages to the css folder in the output folder. Stylesheets that are unchanged are not rewritten. Stylesheets that were written by the pipeline before but are not used anymore are removed.
+
+        -----
+        :param path_output: Path to the output folder.
+        :param stylesheet_sets: Stylesheets used per page as iterable of lists.
+        :returns: Names of the written stylesheets as list.
+        """
+
+        path_css = path_output / 'css'
+        path_css.mkdir(parents=True, exist_ok=True)
+        outputs = self.outputs(stylesheet_sets)
+        path_record = path_css / RECORD
+        try:
+            previous = set(json.loads(path_record.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            previous = set()
+        for path in path_css.glob('*.css'):
+            if path.name in outputs:
+                continue
+            if path.name in previous or _GENERATED.fullmatch(path.name):
+                path.unlink()
+
+        written = list()
+        for name, css in sorted(outputs.items()):
+            path = path_css / name
+            if path.exists() and path.read_text(encoding='utf-8') == css:
+                continue
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(css)
+            written.append(name)
+        with open(path_record, 'w', encoding='utf-8') as f:
+            json.dump(sorted(outputs), f, indent=1)
+        return written
+
+    def _names(self, stylesheets):
+        names = [BASE_STYLESHEET]
+        for name in stylesheets:
+            if name not in names and name in self.sources:
+                names.append(name)
+        return names
+
+    def _hashed_name(self, name):
+        return f'{name[:-4]}.{self.hashes[name]}.css'
+
+    def _bundle_name(self, names):
+        # The order of the section stylesheets is ignored, so pages with the same stylesheets share a bundle
+        names = names[:1] + sorted(names[1:])
+        digest = _hash(','.join(f'{name}:{self.hashes[name]}' for name in names))
+        return f'bundle.{digest}.css'
+
+
+def minify_css(css):
+    """
+    Minify css by removing comments and redundant whitespace. Strings are left untouched. Whitespace before a colon is kept, because it is significant in selectors (e.g. `div :hover`).
+
+    -----
+    :param css: Css as string.
+    :returns: Minified css as string.
+    """
+
+    output = list()
+    text = list()
+    position = 0
+    for match in _TOKEN.finditer(css):
+        text.append(css[position:match.start()])
+        position = match.end()
+        if match.group().startswith('/*'):
+            continue
+        output.append(_minify(''.join(text)))
+        output.append(match.group())
+        text = list()
+    text.append(css[position:])
+    output.append(_minify(''.join(text)))
+    return ''.join(output).strip()
+
+
+def _minify(css):
+    css = _WHITESPACE.sub(' ', css)
+    css = _PUNCTUATION.sub(r'\1', css)
+    return _COLON.sub(':', css).replace(';}', '}')
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:HASH_LENGTH]
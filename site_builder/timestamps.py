@@ -0,0 +1,147 @@
+"""
+The timestamps module
+=====================
+This module contains the Timestamps class which decides the dates that are printed on the pages (created on / last modified on) and on the sitemap. By default these are the creation and modification times of the md file and the date of the build. As a result, two builds of the same content do not give the same output: the dates change whenever the content folder is copied or checked out again, and the sitemap changes every day.
+
+In reproducible mode the dates are taken from a fixed source instead, so building the same content always gives the same output:
+
+========  =====================================================================
+Date      Source
+========  =====================================================================
+Page      The dates of the first and last commit of the md file in the git history of the content folder. Md files without history get the date of SOURCE_DATE_EPOCH.
+Sitemap   The date of SOURCE_DATE_EPOCH, or else the date of the last commit in the content folder.
+========  =====================================================================
+
+SOURCE_DATE_EPOCH is an environment variable containing a unix timestamp (see https://reproducible-builds.org/specs/source-date-epoch/). All dates are in UTC in reproducible mode.
+
+Reproducible mode is switched on with the 'reproducible' flag of the build site script or with `reproducible` in the BUILD section of `config.ini`. It is also switched on whenever SOURCE_DATE_EPOCH is set.
+
+    Objects in this module
+    ----------------------
+    - Timestamps (class)
+    - source_date_epoch (function)
+    - git_dates (function)
+"""
+
+import os
+import subprocess
+import datetime as dt
+from pathlib import Path
+
+
+class Timestamps:
+    """
+    The Timestamps class returns the dates of the pages and the sitemap.
+
+    A Timestamps object is initialized with the following attributes:
+    ==============  ==================================================
+    Attribute       Description
+    ==============  ==================================================
+    reproducible    Whether the dates are taken from a fixed source
+    epoch           Date used for files without history and the sitemap
+    history         Dates of the first and last commit per md file
+    ==============  ==================================================
+
+    A Timestamps object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    page_dates       Return the creation and modification date of a page.
+    build_date       Return the date of the build.
+    ===============  =================================================
+    """
+
+    def __init__(self, reproducible=False, path_content=None):
+        self.reproducible = reproducible
+        self.epoch = None
+        self.history = dict()
+        if not reproducible:
+            return
+
+        epoch = source_date_epoch()
+        if path_content is not None:
+            self.history = git_dates(path_content)
+        if epoch is not None:
+            self.epoch = dt.datetime.fromtimestamp(epoch, dt.timezone.utc)
+        elif self.history:
+            self.epoch = max(last for _, last in self.history.values())
+        else:
+            raise ValueError('A reproducible build needs SOURCE_DATE_EPOCH or a git history of the content folder.')
+
+    def page_dates(self, file_path_md):
+        """
+        Return the creation and modification date of a page.
+
+        -----
+        :param file_path_md: Path to the markdown file of the page.
+        :returns: Tuple of datetimes (creation, modification).
+        """
+
+        if not self.reproducible:
+            stat = file_path_md.stat()
+            return (dt.datetime.fromtimestamp(stat.st_ctime),
+                    dt.datetime.fromtimestamp(stat.st_mtime))
+        return self.history.get(str(Path(file_path_md).resolve()), (self.epoch, self.epoch))
+
+    def build_date(self):
+        """
+        Return the date of the build.
+
+        -----
+        :returns: Datetime.
+        """
+
+        if not self.reproducible:
+            return dt.datetime.now()
+        return self.epoch
+
+
+def source_date_epoch():
+    """
+    Return the value of the SOURCE_DATE_EPOCH environment variable.
+
+    -----
+    :returns: Unix timestamp as integer or None if it is not set.
+    """
+
+    value = os.environ.get('SOURCE_DATE_EPOCH', '').strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'SOURCE_DATE_EPOCH should be a unix timestamp, not {value!r}.') from None
+
+
+def git_dates(path_content):
+    """
+    Return the dates of the first and last commit of every md file in the git history of the content folder. The history is read with a single call to git log.
+
+    -----
+    :param path_content: Path to the content folder.
+    :returns: Dictionary of absolute paths (as string) and tuples of datetimes (first commit, last commit). Empty if the content folder is not in a git repository.
+    """
+
+    try:
+        root = subprocess.run(['git', 'rev-parse', '--show-toplevel'],
+                              cwd=path_content, capture_output=True,
+                              text=True, check=True).stdout.strip()
+        log = subprocess.run(['git', 'log', '--format=%x01%ct', '--name-only',
+                              '--no-renames', '-z', '--', '.'],
+                             cwd=path_content, capture_output=True,
+                             text=True, encoding='utf-8', check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return dict()
+
+    # The log runs from the last commit to the first, every commit starts with \x01 and its timestamp
+    dates = dict()
+    timestamp = None
+    for item in log.split('\x00'):
+        item = item.lstrip('\n')
+        if item.startswith('\x01'):
+            timestamp = dt.datetime.fromtimestamp(int(item[1:]), dt.timezone.utc)
+        elif item.endswith('.md'):
+            path = str((Path(root) / item).resolve())
+            last = dates[path][1] if path in dates else timestamp
+            dates[path] = (timestamp, last)
+    return dates
@@ -0,0 +1,348 @@
+"""
+The watch module
+================
+This module keeps the site builder running after a build, so that changes to the content and templates folders are picked up without starting a new process. The SiteStructure, the jinja2 environments (with their compiled templates) and the imported libraries stay in memory, which brings the time from saving a file to seeing the result down to the rendering of the affected pages.
+
+The folders are watched by polling the modification time and size of their files. Every change is handled according to the kind of file that changed:
+
+========================  ===================================================
+Changed file              Action
+========================  ===================================================
+md file                   Render the page(s) in the md file. If the md file was removed, remove its page from the output folder.
+structure file            Reload the SiteStructure, render all pages whose inputs changed and the sitemap.
+properties.ini            Reload the SiteProperties, render all pages whose inputs changed and the sitemap.
+base*.html                Reload the base templates, render all pages that depend on them and the sitemap.
+snippet_*.html            Reload the snippets, render the pages that use the changed snippets.
+*.css                     Reload the stylesheets. With hashed or bundled stylesheets, render all pages whose inputs changed and the sitemap.
+search.js                 Write the search script.
+iframes / images          Synchronize the assets.
+========================  ===================================================
+
+After a rebuild with rendered or removed pages, the shards of the search index are written for the sections of these pages (see the search module).
+
+Which pages changed is decided by the BuildManifest (see the manifest module). The build number is not incremented while watching.
+
+The output folder is served over http. Html pages are served with a small script that polls the server and reloads the page as soon as a rebuild has finished.
+
+    Objects in this module
+    ----------------------
+    - Watcher (class)
+    - LiveReloadHandler (class)
+    - serve (function)
+    - watch (function)
+    - rebuild (function)
+    - remove_pages (function)
+    - LIVE_RELOAD_SCRIPT (constant)
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+from pathlib import Path
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from site_builder import config
+from site_builder import site_specs
+from site_builder import section_processing
+from site_builder import page_builder
+from site_builder import build
+from site_builder import search
+from site_builder import stylesheets
+
+
+LIVE_RELOAD_PATH = '/__livereload'
+LIVE_RELOAD_SCRIPT = """
+<script>
+(function () {
+    var build = null;
+    function poll() {
+        fetch('%s').then(function (response) {
+            return response.json();
+        }).then(function (data) {
+            if (build !== null && data.build !== build) {
+                location.reload();
+            }
+            build = data.build;
+        }).catch(function () {}).then(function () {
+            setTimeout(poll, 300);
+        });
+    }
+    poll();
+})();
+</script>
+""" % LIVE_RELOAD_PATH
+
+
+class Watcher:
+    """
+    The Watcher class detects changes in a set of folders by comparing snapshots of the modification time and size of their files.
+
+    A Watcher object has the following main methods:
+    ===============  =================================================
+    Method           Description
+    ===============  =================================================
+    changes          Return the paths that changed since the last call.
+    ===============  =================================================
+    """
+
+    def __init__(self, folders, exclude=()):
+        self.folders = [Path(folder) for folder in folders]
+        self.exclude = [Path(folder).resolve() for folder in exclude]
+        self.snapshot = self._take_snapshot()
+
+    def changes(self):
+        """
+        Return the paths of the files that were added, modified or removed since the last call.
+
+        -----
+        :returns: Set of paths.
+        """
+
+        snapshot = self._take_snapshot()
+        changed = {path for path, stat in snapshot.items()
+                   if self.snapshot.get(path) != stat}
+        changed.update(set(self.snapshot) - set(snapshot))
+        self.snapshot = snapshot
+        return changed
+
+    def _take_snapshot(self):
+        snapshot = dict()
+        stack = [folder for folder in self.folders if folder.exists()]
+        while stack:
+            folder = stack.pop()
+            if folder.resolve() in self.exclude:
+                continue
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(Path(entry.path))
+                else:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    """
+    Request handler that serves the output folder. The live reload script is added to every html page that is served and the current build number is served at LIVE_RELOAD_PATH.
+    """
+
+    build = 0
+
+    def do_GET(self):
+        if self.path == LIVE_RELOAD_PATH:
+            self._send(json.dumps(dict(build=LiveReloadHandler.build)).encode(),
+                       'application/json')
+            return
+
+        path = Path(self.translate_path(self.path))
+        if path.is_dir():
+            path = path / 'index.html'
+        if path.suffix == '.html' and path.is_file():
+            html = path.read_text(encoding='utf-8')
+            position = html.rfind('</body>')
+            if position == -1:
+                position = len(html)
+            html = html[:position] + LIVE_RELOAD_SCRIPT + html[position:]
+            self._send(html.encode('utf-8'), 'text/html; charset=utf-8')
+            return
+        super().do_GET()
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(path_output, port=8000):
+    """
+    Serve the output folder with live reload in a background thread.
+
+    -----
+    :param path_output: Path to the output folder.
+    :param port: Port of the http server.
+    :returns: The http server.
+    """
+
+    handler = functools.partial(LiveReloadHandler, directory=str(path_output))
+    server = ThreadingHTTPServer(('localhost', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def watch(path_content, path_templates, path_output, build_manifest,
+          output_hashes, port=8000, interval=0.25):
+    """
+    Serve the output folder and rebuild the affected parts of the site whenever the content or templates folders change. Runs until interrupted (ctrl+c).
+
+    -----
+    :param path_content: Path to the content folder.
+    :param path_templates: Path to the templates folder.
+    :param path_output: Path to the output folder.
+    :param build_manifest: BuildManifest of the last build.
+    :param output_hashes: OutputHashes of the output folder.
+    :param port: Port of the http server.
+    :param interval: Polling interval in seconds.
+    :returns: None
+    """
+
+    server = serve(path_output, port)
+    watcher = Watcher([path_content, path_templates], exclude=[path_output])
+    print(f'Serving {path_output} at http://localhost:{port}/')
+    print('Watching for changes (press ctrl+c to stop)...')
+
+    try:
+        while True:
+            time.sleep(interval)
+            changed = watcher.changes()
+            if not changed:
+                continue
+            start = time.perf_counter()
+            try:
+                rendered = rebuild(changed, path_content, path_templates,
+                                   path_output, build_manifest, output_hashes)
+            except Exception as e:
+                print(f'Rebuild failed: {e!r}')
+                continue
+            LiveReloadHandler.build += 1
+            duration = time.perf_counter() - start
+            print(f'Rebuilt {rendered} pages in {duration:.2f} sec.')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        build_manifest.save()
+        output_hashes.save()
+
+
+def rebuild(changed, path_content, path_templates, path_output, build_manifest,
+            output_hashes=None):
+    """
+    Rebuild the parts of the site affected by the changed files.
+
+    -----
+    :param changed: Paths of the changed files.
+    :param path_content: Path to the content folder.
+    :param path_templates: Path to the templates folder.
+    :param path_output: Path to the output folder.
+    :param build_manifest: BuildManifest of the last build.
+    :param output_hashes: OutputHashes of the output folder, else None.
+    :returns: Number of rendered pages.
+    """
+
+    PageBuilder = page_builder.PageBuilder
+    path_content = Path(path_content).resolve()
+    path_templates = Path(path_templates).resolve()
+
+    all_pages = False
+    sitemap = False
+    assets = False
+    removed = False
+    script = False
+    md_files = set()
+    for path in changed:
+        path = path.resolve()
+        if path.parent == path_templates:
+            if path.suffix == '.css':
+                pipeline = stylesheets.StylesheetPipeline(path_templates, PageBuilder.stylesheet_pipeline.mode)
+                PageBuilder.stylesheet_pipeline = pipeline
+                if pipeline.mode != 'plain':
+                    all_pages = sitemap = True
+            elif path.name.startswith('base'):
+                PageBuilder.PageEnv = page_builder.load_templates()
+                all_pages = sitemap = True
+            elif path.name.startswith('snippet_'):
+                section_processing.SNIPPETS_ENV = section_processing._load_snippets()
+                all_pages = True
+            elif path.name == search.SCRIPT:
+                script = True
+        elif path == path_content / config.BUILD_CONFIG['structure_file']:
+            PageBuilder.structure = site_specs.load_structure(path)
+            PageBuilder.PageEnv.fragment_cache.clear()
+            all_pages = sitemap = True
+        elif path == path_content / 'properties.ini':
+            site_specs.SiteProperties.load_properties(no_increment=True)
+            PageBuilder.PageEnv.fragment_cache.clear()
+            all_pages = sitemap = True
+        elif path.suffix == '.md':
+            if path.exists():
+                md_files.add(path)
+            else:
+                removed = True
+        elif path_content / 'iframes' in path.parents or path_content / 'images' in path.parents:
+            assets = True
+
+    if assets:
+        build.copy_assets(path_content, path_output)
+
+    structure = PageBuilder.structure
+    files = build.find_pages(path_content) if all_pages else sorted(md_files)
+    results = build.build_pages(files, structure, path_output,
+                                build_manifest=build_manifest,
+                                output_hashes=output_hashes)
+    for result in results:
+        for code in result.unresolved:
+            print(f'Unresolved crossref [{code}] on page {result.page_id} ({result.href}).')
+    if all_pages:
+        build_manifest.retain(result.href for result in results)
+        if output_hashes is not None:
+            output_hashes.retain([result.href for result in results] + [build.SITEMAP])
+    elif removed:
+        for href in remove_pages(path_content, path_output, build_manifest, output_hashes):
+            print(f'Removed page {href}.')
+    if sitemap:
+        build.write_sitemap(path_output, output_hashes)
+    rendered = [result.href for result in results if result.rendered]
+    if rendered or removed or all_pages or script:
+        build.write_search_index(path_output,
+                                 ((href, entry['page_id']) for href, entry
+                                  in build_manifest.pages.items()),
+                                 rendered)
+    build.copy_stylesheets(path_output, (entry['stylesheets'] for entry
+                                         in build_manifest.pages.values()))
+    return sum(result.rendered for result in results)
+
+
+def remove_pages(path_content, path_output, build_manifest, output_hashes=None):
+    """
+    Remove the pages of which the md file was removed from the output folder, the manifest and the output hashes. The page ids of the md files in the content folder are read from their first line, so a page whose md file was moved is kept. The terms of the removed pages are removed with the search index.
+
+    -----
+    :param path_content: Path to the content folder.
+    :param path_output: Path to the output folder.
+    :param build_manifest: BuildManifest of the last build.
+    :param output_hashes: OutputHashes of the output folder, else None.
+    :returns: Hrefs of the removed pages as list.
+    """
+
+    page_ids = set()
+    for path in build.find_pages(path_content):
+        with open(path, encoding='utf-8') as f:
+            page_ids.add(f.readline().rstrip('\n'))
+
+    removed = [href for href, entry in build_manifest.pages.items()
+               if entry['page_id'] not in page_ids]
+    for href in removed:
+        try:
+            (Path(path_output) / href).unlink()
+        except FileNotFoundError:
+            pass
+    hrefs = [href for href in build_manifest.pages if href not in removed]
+    build_manifest.retain(hrefs)
+    if output_hashes is not None:
+        output_hashes.retain(hrefs + [build.SITEMAP])
+    return removed
@@ -0,0 +1,262 @@
+/*
+Search widget of the site builder. The list of shards of the search index
+(see the search module) is loaded when the search field is first used. The
+shards are loaded one at a time when searching, starting with the shard of
+the current section, and the results are shown as every shard arrives. Loaded
+shards are kept for the next searches. Words are matched as whole terms,
+except for the last word, which also matches as prefix while typing. Text
+between double quotes is matched as a phrase.
+*/
+(function () {
+    'use strict';
+    var form = document.querySelector('.search');
+    if (!form) {
+        return;
+    }
+    var input = form.querySelector('.search__input');
+    var list = form.querySelector('.search__results');
+    var nest = form.getAttribute('data-nest') || '';
+    var section = form.getAttribute('data-section') || '';
+    var MAX_RESULTS = 20;
+    var TITLE_BONUS = 10;
+    var index = null;
+    var shards = {};
+    var timer = null;
+
+    function inflate(buffer) {
+        var bytes = new Uint8Array(buffer);
+        // The server may already have decompressed the shard
+        if (bytes[0] !== 0x1f || bytes[1] !== 0x8b) {
+            return Promise.resolve(new TextDecoder().decode(bytes));
+        }
+        var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+        return new Response(stream).text();
+    }
+
+    // Return the list of shards, with the shard of the current section first
+    function loadIndex() {
+        if (index === null) {
+            index = fetch(nest + 'search/index.json').then(function (response) {
+                return response.json();
+            }).then(function (data) {
+                var current = data.shards.filter(function (entry) {
+                    return entry.section === section;
+                });
+                return current.concat(data.shards.filter(function (entry) {
+                    return entry.section !== section;
+                }));
+            });
+            index.catch(function () {
+                index = null;
+            });
+        }
+        return index;
+    }
+
+    function loadShard(entry) {
+        if (!shards[entry.file]) {
+            shards[entry.file] = fetch(nest + 'search/' + entry.file).then(function (response) {
+                return response.arrayBuffer();
+            }).then(inflate).then(function (text) {
+                var shard = JSON.parse(text);
+                shard.keys = Object.keys(shard.terms);
+                return shard;
+            });
+            shards[entry.file].catch(function () {
+                delete shards[entry.file];
+            });
+        }
+        return shards[entry.file];
+    }
+
+    function tokenize(text) {
+        return text.toLowerCase().match(/[\p{L}\p{N}_]+/gu) || [];
+    }
+
+    function parse(query) {
+        var phrases = [];
+        query.replace(/"([^"]*)"?|[^\s"]+/g, function (match, phrase) {
+            var terms = tokenize(phrase === undefined ? match : phrase);
+            if (terms.length) {
+                phrases.push(terms);
+            }
+        });
+        return phrases;
+    }
+
+    function positions(posting) {
+        var found = [];
+        var position = 0;
+        for (var i = 1; i < posting.length; i++) {
+            position += posting[i];
+            found.push(position);
+        }
+        return found;
+    }
+
+    // Return the positions of a term per page index
+    function lookup(shard, term, prefix) {
+        var pages = {};
+        var terms = prefix ? shard.keys.filter(function (key) {
+            return key.lastIndexOf(term, 0) === 0;
+        }) : [term];
+        terms.forEach(function (key) {
+            (shard.terms[key] || []).forEach(function (posting) {
+                pages[posting[0]] = (pages[posting[0]] || []).concat(positions(posting));
+            });
+        });
+        return pages;
+    }
+
+    // Return the start positions of a phrase per page index
+    function match(shard, phrase, prefix) {
+        var last = phrase.length - 1;
+        var found = lookup(shard, phrase[0], prefix && last === 0);
+        for (var i = 1; i <= last; i++) {
+            var next = lookup(shard, phrase[i], prefix && i === last);
+            var combined = {};
+            Object.keys(found).forEach(function (page) {
+                if (!next[page]) {
+                    return;
+                }
+                var following = new Set(next[page]);
+                var starts = found[page].filter(function (position) {
+                    return following.has(position + i);
+                });
+                if (starts.length) {
+                    combined[page] = starts;
+                }
+            });
+            found = combined;
+        }
+        return found;
+    }
+
+    // Return the pages of a shard that match the query
+    function search(query, shard) {
+        var phrases = parse(query);
+        var words = tokenize(query);
+        var prefix = !/[\s"]$/.test(query);
+        var results = [];
+        if (!phrases.length) {
+            return results;
+        }
+        var scores = null;
+        phrases.forEach(function (phrase, idx) {
+            var found = match(shard, phrase, prefix && idx === phrases.length - 1);
+            var next = {};
+            Object.keys(found).forEach(function (page) {
+                if (scores === null || page in scores) {
+                    next[page] = (scores === null ? 0 : scores[page]) + found[page].length;
+                }
+            });
+            scores = next;
+        });
+        Object.keys(scores).forEach(function (page) {
+            var entry = shard.pages[page];
+            var title = tokenize(entry[1]);
+            var bonus = words.filter(function (word) {
+                return title.indexOf(word) !== -1;
+            }).length * TITLE_BONUS;
+            results.push({
+                href: entry[0],
+                page: entry[1],
+                path: [shard.section, entry[2]].filter(Boolean).join(' › '),
+                score: scores[page] + bonus,
+            });
+        });
+        return results;
+    }
+
+    function rank(results) {
+        results.sort(function (a, b) {
+            return b.score - a.score || a.page.localeCompare(b.page);
+        });
+        return results.slice(0, MAX_RESULTS);
+    }
+
+    function render(results, message) {
+        list.textContent = '';
+        results.forEach(function (result) {
+            var item = document.createElement('li');
+            var link = document.createElement('a');
+            var path = document.createElement('span');
+            link.href = nest + result.href;
+            link.textContent = result.page;
+            path.className = 'search__path';
+            path.textContent = result.path;
+            item.appendChild(link);
+            item.appendChild(path);
+            list.appendChild(item);
+        });
+        if (message) {
+            var item = document.createElement('li');
+            item.className = 'search__message';
+            item.textContent = message;
+            list.appendChild(item);
+        }
+    }
+
+    // Search the shards one after another and show the results found so far
+    function update() {
+        var query = input.value;
+        if (!query.trim()) {
+            render([]);
+            return;
+        }
+        var results = [];
+        loadIndex().then(function (entries) {
+            return entries.reduce(function (previous, entry, idx) {
+                return previous.then(function () {
+                    if (input.value !== query) {
+                        return;
+                    }
+                    return loadShard(entry).then(function (shard) {
+                        if (input.value !== query) {
+                            return;
+                        }
+                        results = rank(results.concat(search(query, shard)));
+                        if (idx < entries.length - 1) {
+                            render(results, form.getAttribute('data-loading'));
+                        } else {
+                            render(results, results.length ? '' : form.getAttribute('data-empty'));
+                        }
+                    });
+                });
+            }, Promise.resolve()).then(function () {
+                if (!entries.length && input.value === query) {
+                    render([], form.getAttribute('data-empty'));
+                }
+            });
+        }).catch(function () {
+            if (input.value === query) {
+                render(results, form.getAttribute('data-error'));
+            }
+        });
+    }
+
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        var link = list.querySelector('a');
+        if (link) {
+            location.href = link.href;
+        }
+    });
+    input.addEventListener('focus', function () {
+        loadIndex().then(function (entries) {
+            if (entries.length) {
+                loadShard(entries[0]);
+            }
+        }, function () {});
+    });
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(update, 100);
+    });
+    input.addEventListener('keydown', function (event) {
+        if (event.key === 'Escape') {
+            input.value = '';
+            render([]);
+        }
+    });
+})();